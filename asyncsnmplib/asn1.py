@@ -67,10 +67,37 @@ class Tag(NamedTuple):
     cls: TClass
 
 
+# SNMP application types which are unsigned, agents do not always prefix a
+# value with the high bit set with a zero byte
+_UNSIGNED = frozenset(map(int, (
+    Number.TimeTicks,
+    Number.Gauge32,
+    Number.Counter32,
+    Number.Counter64,
+)))
+_SIGNED = frozenset(map(int, (
+    Number.Integer,
+    Number.Enumerated,
+)))
+_NO_VALUE = frozenset(map(int, (
+    Number.EndOfMibView,
+    Number.NoSuchObject,
+    Number.NoSuchInstance,
+)))
+
+
 class Error(Exception):
     pass
 
 
+def encode_length(length: int) -> bytes:
+    """Return the definite form of a length field."""
+    if length < 0x80:
+        return bytes((length, ))
+    encoded = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes((0x80 | len(encoded), )) + encoded
+
+
 class Decoder:
     __slots__ = ("m_stack", "m_tag")
 
@@ -139,6 +166,19 @@ class Decoder:
         """
         return self._end_of_input()
 
+    def offset(self) -> int:
+        """Return the current decoding offset in the (outermost) input.
+
+        Returns:
+            int: The offset in bytes.
+        """
+        stack = self.m_stack
+        offset = stack[-1][0]
+        for i in range(1, len(stack)):
+            # the parent offset is at the end of the entered contents
+            offset += stack[i - 1][0] - len(stack[i][1])
+        return offset
+
     @contextmanager
     def enter(self) -> Iterator[None]:
         """This method enters the constructed type that is at the current
@@ -188,14 +228,7 @@ class Decoder:
             count = byte & 0x7F
             if count == 0x7F:
                 raise Error("ASN1 syntax error")
-            bytes_data = self._read_bytes(count)
-            length = 0
-            for byte in bytes_data:
-                length = (length << 8) | int(byte)
-            try:
-                length = int(length)
-            except OverflowError:
-                pass
+            length = int.from_bytes(self._read_bytes(count), 'big')
         else:
             length = byte
         return length
@@ -203,26 +236,19 @@ class Decoder:
     def _read_value(self, nr: TNumber, length: int) -> Any:
         """Read a value from the input."""
         bytes_data = self._read_bytes(length)
-        if nr == Number.Boolean:
-            return self._decode_boolean(bytes_data)
-        elif nr in (
-            Number.Integer,
-            Number.Enumerated,
-            Number.TimeTicks,
-            Number.Gauge32,
-            Number.Counter32,
-            Number.Counter64,
-        ):
-            return self._decode_integer(bytes_data)
-        elif nr == Number.Null:
-            return self._decode_null(bytes_data)
+        # most common types first
+        if nr in _UNSIGNED:
+            return self._decode_unsigned(bytes_data)
         elif nr == Number.ObjectIdentifier:
             return self._decode_object_identifier(bytes_data)
-        elif nr in (
-                Number.EndOfMibView,
-                Number.NoSuchObject,
-                Number.NoSuchInstance):
+        elif nr in _SIGNED:
+            return self._decode_integer(bytes_data)
+        elif nr in _NO_VALUE:
             return None
+        elif nr == Number.Boolean:
+            return self._decode_boolean(bytes_data)
+        elif nr == Number.Null:
+            return self._decode_null(bytes_data)
         return bytes_data
 
     def _read_byte(self) -> int:
@@ -259,28 +285,15 @@ class Decoder:
 
     @staticmethod
     def _decode_integer(bytes_data: bytes) -> int:
-        values = [int(b) for b in bytes_data]
-        negative = values[0] & 0x80
-        if negative:
-            # make positive by taking two's complement
-            for i in range(len(values)):
-                values[i] = 0xFF - values[i]
-            for i in range(len(values) - 1, -1, -1):
-                values[i] += 1
-                if values[i] <= 0xFF:
-                    break
-                assert i > 0
-                values[i] = 0x00
-        value = 0
-        for val in values:
-            value = (value << 8) | val
-        if negative:
-            value = -value
-        try:
-            value = int(value)
-        except OverflowError:
-            pass
-        return value
+        if not bytes_data:
+            raise Error("ASN1 syntax error")
+        return int.from_bytes(bytes_data, 'big', signed=True)
+
+    @staticmethod
+    def _decode_unsigned(bytes_data: bytes) -> int:
+        if not bytes_data:
+            raise Error("ASN1 syntax error")
+        return int.from_bytes(bytes_data, 'big')
 
     @staticmethod
     def _decode_null(bytes_data: bytes) -> None:
@@ -289,18 +302,26 @@ class Decoder:
 
     @staticmethod
     def _decode_object_identifier(bytes_data: bytes) -> TOid:
+        if bytes_data and max(bytes_data) < 0x80:
+            # fast path, all arcs fit in a single byte
+            first = bytes_data[0]
+            if first >= 80:
+                return (2, first - 80, *bytes_data[1:])
+            return (first // 40, first % 40, *bytes_data[1:])
+
         result: list[int] = []
         value: int = 0
-        for i in range(len(bytes_data)):
-            byte = int(bytes_data[i])
+        for byte in bytes_data:
             if value == 0 and byte == 0x80:
                 raise Error("ASN1 syntax error")
             value = (value << 7) | (byte & 0x7F)
             if not byte & 0x80:
                 result.append(value)
                 value = 0
-        if len(result) == 0 or result[0] > 1599:
+        if len(result) == 0:
             raise Error("ASN1 syntax error")
-        result = [result[0] // 40, result[0] % 40] + result[1:]
-        # return '.'.join(str(x) for x in result)
-        return tuple(result)
+        first = result[0]
+        if first >= 80:
+            # the second arc of joint-iso-itu-t (2) is not limited to 39
+            return (2, first - 80, *result[1:])
+        return (first // 40, first % 40, *result[1:])
@@ -1,21 +1,26 @@
 import asyncio
-from typing import Iterable, Optional, Type
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Optional, Type
 from .exceptions import (
     SnmpNoConnection,
     SnmpErrorNoSuchName,
     SnmpTimeoutError,
     SnmpTooMuchRows,
     SnmpNoAuthParams,
+    SnmpNotInTimeWindow,
+    SnmpUnknownEngineId,
 )
 from .asn1 import Tag, TOid, TValue
-from .package import SnmpMessage
-from .pdu import SnmpGet, SnmpGetNext, SnmpGetBulk, ScopedPDU
+from .columnar import ColumnarResult
+from .package import SnmpMessage, SnmpPreparedMessage
+from .pdu import PDU, SnmpGet, SnmpGetNext, SnmpGetBulk, ScopedPDU
 from .protocol import SnmpProtocol, DEFAULT_TIMEOUTS
 from .v3.auth import Auth
 from .v3.encr import Priv
 from .v3.package import SnmpV3Message
-from .v3.protocol import SnmpV3Protocol
+from .v3.protocol import SnmpV3Protocol, OFFLOAD_THRESHOLD
 from .v3.cache import SnmpV3Cache
+from .v3.engine_store import SnmpV3EngineStore
 
 
 class Snmp:
@@ -80,6 +85,23 @@ class Snmp:
         message = SnmpMessage.make(self.version, self.community, pdu)
         return self._protocol.send(message)
 
+    def prepare_get(self, oids: Iterable[TOid]) -> SnmpPreparedMessage:
+        pdu = SnmpGet(variable_bindings=list(oids))
+        return SnmpPreparedMessage(self.version, self.community, pdu)
+
+    def prepare_get_bulk(self, oids: Iterable[TOid],
+                         max_repetitions: int = 20) -> SnmpPreparedMessage:
+        pdu = SnmpGetBulk(variable_bindings=list(oids),
+                          max_repetitions=max_repetitions)
+        return SnmpPreparedMessage(self.version, self.community, pdu)
+
+    async def send_prepared(self, prepared: SnmpPreparedMessage
+                            ) -> list[tuple[TOid, Tag, TValue]]:
+        if self._protocol is None:
+            raise SnmpNoConnection
+        vbs, _ = await self._protocol.send(prepared)
+        return vbs
+
     async def get(self, oid: TOid, timeout: Optional[float] = None
                   ) -> tuple[TOid, Tag, TValue]:
         vbs, _ = await self._get([oid], timeout)
@@ -99,11 +121,11 @@ class Snmp:
         vbs, _ = await self._get_bulk([oid], max_repetitions)
         return vbs
 
-    async def walk(self, oid: TOid, is_table: bool = False,
-                   ) -> list[tuple[TOid, TValue]]:
+    async def _walk(self, oid: TOid, is_table: bool,
+                    on_row: Callable[[TOid, Tag, TValue], None]):
         next_oid: TOid = oid
         prefixlen = len(oid)
-        rows: list[tuple[TOid, TValue]] = []
+        nrows = 0
 
         prev_size = 0
         max_r = 10
@@ -112,7 +134,7 @@ class Snmp:
             vbs, size = await self._get_bulk([next_oid], max_r)
             size = size if size > prev_size else prev_size
             max_r = max(10, min(80, 1472 // (size // max_r)))
-            for next_oid, _, value in vbs:
+            for next_oid, tag, value in vbs:
                 if next_oid[:prefixlen] != oid or value is None:
                     # we're done
                     break
@@ -120,9 +142,10 @@ class Snmp:
                 if is_table or next_oid[prefixlen + 1] == 0:
                     # this is a row we want in the result, otherwise
                     # we are in a table
-                    if len(rows) == self.max_rows:
+                    if nrows == self.max_rows:
                         raise SnmpTooMuchRows
-                    rows.append((next_oid, value))
+                    nrows += 1
+                    on_row(next_oid, tag, value)
 
                 continue
             else:
@@ -132,8 +155,43 @@ class Snmp:
                 continue
             break
 
+    async def walk(self, oid: TOid, is_table: bool = False,
+                   ) -> list[tuple[TOid, TValue]]:
+        rows: list[tuple[TOid, TValue]] = []
+        await self._walk(
+            oid, is_table, lambda oid, _, value: rows.append((oid, value)))
+        return rows
+
+    async def walk_relative(self, oid: TOid, is_table: bool = False,
+                            ) -> list[tuple[int, TOid, TValue]]:
+        """returns (column, index, value) rows relative to the walked oid
+
+        Index tuples are interned so all columns of a table row share one
+        tuple instead of each holding a copy of the full OID.
+        """
+        prefixlen = len(oid) + 1
+        indexes: dict[TOid, TOid] = {}
+        rows: list[tuple[int, TOid, TValue]] = []
+
+        def on_row(oid: TOid, _: Tag, value: TValue):
+            idx = oid[prefixlen:]
+            idx = indexes.setdefault(idx, idx)
+            rows.append((oid[prefixlen - 1], idx, value))
+
+        await self._walk(oid, is_table, on_row)
         return rows
 
+    async def walk_columnar(self, oid: TOid, is_table: bool = False,
+                            ) -> ColumnarResult:
+        prefixlen = len(oid) + 1
+        result = ColumnarResult()
+        await self._walk(
+            oid, is_table,
+            lambda oid, tag, value: result.add(
+                oid[prefixlen - 1], oid[prefixlen:], tag, value))
+        result.finish()
+        return result
+
     def close(self):
         if self._transport is not None and not self._transport.is_closing():
             self._transport.close()
@@ -147,11 +205,15 @@ class SnmpV1(Snmp):
     async def get_bulk(self, oid: TOid, max_repetitions: int = 20):
         raise Exception('GETBULK not available for SNMP v1')
 
-    async def walk(self, oid: TOid, is_table: bool = False,
-                   ) -> list[tuple[TOid, TValue]]:
+    def prepare_get_bulk(self, oids: Iterable[TOid],
+                         max_repetitions: int = 20) -> SnmpPreparedMessage:
+        raise Exception('GETBULK not available for SNMP v1')
+
+    async def _walk(self, oid: TOid, is_table: bool,
+                    on_row: Callable[[TOid, Tag, TValue], None]):
         next_oid: TOid = oid
         prefixlen = len(oid)
-        rows: list[tuple[TOid, TValue]] = []
+        nrows = 0
 
         while True:
             try:
@@ -160,7 +222,7 @@ class SnmpV1(Snmp):
                 # snmp v1 uses error-status instead of end-of-mib exception
                 break
 
-            for next_oid, _, value in vbs:
+            for next_oid, tag, value in vbs:
                 if next_oid[:prefixlen] != oid:
                     # we're done
                     break
@@ -168,9 +230,10 @@ class SnmpV1(Snmp):
                 if is_table or next_oid[prefixlen + 1] == 0:
                     # this is a row we want in the result, otherwise
                     # we are in a table
-                    if len(rows) == self.max_rows:
+                    if nrows == self.max_rows:
                         raise SnmpTooMuchRows
-                    rows.append((next_oid, value))
+                    nrows += 1
+                    on_row(next_oid, tag, value)
 
                 continue
             else:
@@ -180,8 +243,6 @@ class SnmpV1(Snmp):
                 continue
             break
 
-        return rows
-
 
 class SnmpV3(Snmp):
     version = 3
@@ -196,7 +257,10 @@ class SnmpV3(Snmp):
             max_rows: int = 10_000,
             loop: Optional[asyncio.AbstractEventLoop] = None,
             cache: Optional[SnmpV3Cache] = None,
-            timeouts: tuple[int, ...] = DEFAULT_TIMEOUTS):
+            timeouts: tuple[int, ...] = DEFAULT_TIMEOUTS,
+            engine_store: Optional[SnmpV3EngineStore] = None,
+            executor: Optional[Executor] = None,
+            offload_threshold: int = OFFLOAD_THRESHOLD):
         self._loop = loop if loop else asyncio.get_running_loop()
         self._protocol = None
         self._transport = None
@@ -206,6 +270,30 @@ class SnmpV3(Snmp):
         self.max_rows = max_rows
         self._username = username.encode()
         self._timeouts = timeouts
+        self._engine_store = engine_store
+        self._executor = executor
+        self._offload_threshold = offload_threshold
+        if engine_store is not None:
+            engine = engine_store.get(self._target)
+            if engine is not None:
+                self._cache.warm(*engine)
+
+    @property
+    def _target(self) -> str:
+        return f'{self.host}:{self.port}'
+
+    def _store_engine(self):
+        assert self._engine_store is not None
+        engine = self._cache.engine_state()
+        if engine is not None:
+            self._engine_store.set(self._target, *engine)
+
+    def prepare_get(self, oids: Iterable[TOid]) -> SnmpPreparedMessage:
+        raise Exception('Prepared requests not available for SNMP v3')
+
+    def prepare_get_bulk(self, oids: Iterable[TOid],
+                         max_repetitions: int = 20) -> SnmpPreparedMessage:
+        raise Exception('Prepared requests not available for SNMP v3')
 
     # On some systems it seems to be required to set the remote_addr argument
     # https://docs.python.org/3/library/asyncio-eventloop.html#asyncio.loop.create_datagram_endpoint
@@ -215,7 +303,11 @@ class SnmpV3(Snmp):
             family, *_, addr = infos[0]
             transport, protocol = await asyncio.wait_for(
                 self._loop.create_datagram_endpoint(
-                    lambda: SnmpV3Protocol(addr, timeouts=self._timeouts),
+                    lambda: SnmpV3Protocol(
+                        addr,
+                        timeouts=self._timeouts,
+                        executor=self._executor,
+                        offload_threshold=self._offload_threshold),
                     remote_addr=(self.host, self.port),
                     family=family),
                 timeout=timeout)
@@ -250,102 +342,83 @@ class SnmpV3(Snmp):
 
         return params
 
-    async def _get(self, oids: Iterable[TOid],
-                   timeout: Optional[float] = None
-                   ) -> tuple[list[tuple[TOid, Tag, TValue]], int]:
+    async def _send_pdu(self, pdu: PDU, timeout: Optional[float] = None,
+                        retry: bool = True
+                        ) -> tuple[list[tuple[TOid, Tag, TValue]], int]:
         if self._protocol is None:
             raise SnmpNoConnection
         params, is_new = await self._cache.get_params(self.get_auth_params)
         if params is None:
             raise SnmpNoAuthParams
-        pdu = SnmpGet(variable_bindings=oids)
         spdu = ScopedPDU(pdu, params[0])
         params = [*params[:3], self._username, b'', b'']
         message = SnmpV3Message.make(spdu, params)
-        if timeout:
-            try:
+        send_timeout = timeout
+        if not send_timeout and retry and not self._cache._confirmed:
+            # params from the engine store might be stale (or the agent is
+            # down), a single try before falling back to a discovery
+            send_timeout = self._timeouts[0]
+        # an unauthenticated unknown engine id report is accepted when a
+        # new discovery is allowed, for example after the agent's engine
+        # id is changed
+        accept_report = retry and not is_new and self._cache.may_rediscover()
+        try:
+            if send_timeout:
                 res = await self._protocol._send_encrypted(
                     message,
                     self._cache._auth_proto,
-                    self._cache._auth_hash_localized,
+                    self._cache._auth_hmac,
                     self._cache._priv_proto,
                     self._cache._priv_hash_localized,
-                    timeout=timeout)
-            except Exception:
-                if is_new:
-                    raise
-                self._cache.clear()
-                res = await self._get(oids, timeout)
-                return res
+                    timeout=send_timeout,
+                    accept_report=accept_report)
             else:
-                return res
-        try:
-            res = await self._protocol.send_encrypted(
-                message,
-                self._cache._auth_proto,
-                self._cache._auth_hash_localized,
-                self._cache._priv_proto,
-                self._cache._priv_hash_localized)
-        except Exception:
-            if is_new:
+                res = await self._protocol.send_encrypted(
+                    message,
+                    self._cache._auth_proto,
+                    self._cache._auth_hmac,
+                    self._cache._priv_proto,
+                    self._cache._priv_hash_localized,
+                    accept_report=accept_report)
+        except SnmpTimeoutError:
+            # params from the engine store might be stale, the agent
+            # may drop the request instead of sending a report
+            if not retry or self._cache._confirmed:
+                raise
+            self._cache.clear()
+        except SnmpNotInTimeWindow as e:
+            # the report carries the current engine boots and time, there is
+            # no need for a new discovery
+            if not retry or e.params is None or \
+                    not self._cache.resync(e.params):
+                raise
+        except SnmpUnknownEngineId:
+            if not retry or is_new:
                 raise
             self._cache.clear()
-            res = await self._get(oids)
-            return res
         else:
+            if not self._cache._confirmed:
+                self._cache._confirmed = True
+                is_new = True
+            if self._engine_store is not None and (is_new or not retry):
+                self._store_engine()
             return res
+        # other errors are raised without clearing the cache
+        return await self._send_pdu(pdu, timeout, retry=False)
+
+    async def _get(self, oids: Iterable[TOid],
+                   timeout: Optional[float] = None
+                   ) -> tuple[list[tuple[TOid, Tag, TValue]], int]:
+        pdu = SnmpGet(variable_bindings=oids)
+        return await self._send_pdu(pdu, timeout)
 
     async def _get_next(self, oids: Iterable[TOid]
                         ) -> tuple[list[tuple[TOid, Tag, TValue]], int]:
-        if self._protocol is None:
-            raise SnmpNoConnection
-        params, is_new = await self._cache.get_params(self.get_auth_params)
-        if params is None:
-            raise SnmpNoAuthParams
         pdu = SnmpGetNext(variable_bindings=oids)
-        spdu = ScopedPDU(pdu, params[0])
-        params = [*params[:3], self._username, b'', b'']
-        message = SnmpV3Message.make(spdu, params)
-        try:
-            res = await self._protocol.send_encrypted(
-                message,
-                self._cache._auth_proto,
-                self._cache._auth_hash_localized,
-                self._cache._priv_proto,
-                self._cache._priv_hash_localized)
-        except Exception:
-            if is_new:
-                raise
-            self._cache.clear()
-            res = await self._get_next(oids)
-            return res
-        else:
-            return res
+        return await self._send_pdu(pdu)
 
     async def _get_bulk(self, oids: Iterable[TOid], max_repetitions: int = 20
                         ) -> tuple[list[tuple[TOid, Tag, TValue]], int]:
-        if self._protocol is None:
-            raise SnmpNoConnection
-        params, is_new = await self._cache.get_params(self.get_auth_params)
-        if params is None:
-            raise SnmpNoAuthParams
         pdu = SnmpGetBulk(variable_bindings=oids,
                           max_repetitions=max_repetitions)
-        spdu = ScopedPDU(pdu, params[0])
-        params = [*params[:3], self._username, b'', b'']
-        message = SnmpV3Message.make(spdu, params)
-        try:
-            res = await self._protocol.send_encrypted(
-                message,
-                self._cache._auth_proto,
-                self._cache._auth_hash_localized,
-                self._cache._priv_proto,
-                self._cache._priv_hash_localized)
-        except Exception:
-            if is_new:
-                raise
-            self._cache.clear()
-            res = await self._get_bulk(oids, max_repetitions)
-            return res
-        else:
-            return res
+        return await self._send_pdu(pdu)
@@ -0,0 +1,116 @@
+import importlib
+from array import array
+from typing import Any, Optional, Union
+from .asn1 import Number, Tag, TOid, TValue
+
+# typecode for the array which stores a column, other columns are stored in
+# a list; the tag is taken from the first value in a column
+_TYPECODES = {
+    Number.Integer: 'q',
+    Number.Counter32: 'Q',
+    Number.Gauge32: 'Q',
+    Number.TimeTicks: 'Q',
+    Number.Counter64: 'Q',
+    Number.Uinteger32: 'Q',
+}
+
+TValues = Union['array[int]', list[TValue]]
+
+
+class Column:
+    """Values of one table column, aligned with `ColumnarResult.index`.
+
+    Integer columns are stored in an array('q') or array('Q'). Cells which
+    the agent did not return are stored as 0 (or None for a list column)
+    and their positions are kept in `missing`.
+    """
+    __slots__ = ('values', 'missing')
+
+    def __init__(self, values: TValues):
+        self.values = values
+        self.missing: Optional[set[int]] = None
+
+    def _to_list(self):
+        if isinstance(self.values, array):
+            values: list[TValue] = self.values.tolist()
+            for pos in self.missing or ():
+                values[pos] = None
+            self.values = values
+
+    def pad(self, size: int):
+        count = size - len(self.values)
+        if count <= 0:
+            return
+        if self.missing is None:
+            self.missing = set()
+        self.missing.update(range(len(self.values), size))
+        values = self.values
+        if isinstance(values, array):
+            values.frombytes(bytes(count * values.itemsize))
+        else:
+            values.extend([None] * count)
+
+    def set(self, pos: int, value: TValue):
+        if pos > len(self.values):
+            self.pad(pos)
+        try:
+            if pos == len(self.values):
+                self.values.append(value)
+            else:
+                self.values[pos] = value
+        except (TypeError, OverflowError):
+            # the agent returned a value which does not fit the type of the
+            # column, fall back to a list
+            self._to_list()
+            self.set(pos, value)
+            return
+        if self.missing is not None:
+            self.missing.discard(pos)
+
+
+class ColumnarResult:
+    """Table walk result with one index vector and a value vector per column.
+
+    Columns are keyed by the column arc (the first arc after the walked
+    OID) and `index` holds the index suffix of each row.
+    """
+    __slots__ = ('index', 'columns', '_positions')
+
+    def __init__(self):
+        self.index: list[TOid] = []
+        self.columns: dict[int, Column] = {}
+        self._positions: dict[TOid, int] = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, column: int, idx: TOid, tag: Tag, value: TValue):
+        pos = self._positions.get(idx)
+        if pos is None:
+            pos = self._positions[idx] = len(self.index)
+            self.index.append(idx)
+
+        col = self.columns.get(column)
+        if col is None:
+            typecode = _TYPECODES.get(tag.nr | tag.cls)  # type: ignore
+            col = self.columns[column] = Column(
+                [] if typecode is None else array(typecode))
+        col.set(pos, value)
+
+    def finish(self):
+        """pads all columns to the number of rows"""
+        size = len(self.index)
+        for col in self.columns.values():
+            col.pad(size)
+
+    def to_numpy(self, column: int) -> Any:
+        """returns a column as NumPy array (requires numpy)
+
+        Integer columns are returned as a view on the array without copying.
+        """
+        numpy: Any = importlib.import_module('numpy')
+        values = self.columns[column].values
+        if isinstance(values, array):
+            dtype = numpy.int64 if values.typecode == 'q' else numpy.uint64
+            return numpy.frombuffer(values, dtype=dtype)
+        return numpy.array(values, dtype=object)
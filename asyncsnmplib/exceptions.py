@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, Optional
 
 
 __all__ = (
@@ -35,6 +35,17 @@ class SnmpAuthV3Exception(Exception):
     pass
 
 
+class SnmpNotInTimeWindow(SnmpAuthV3Exception):
+    def __init__(self, msg: str = '', params: Any = None):
+        super().__init__(msg)
+        # security parameters of the report (engine boots and time)
+        self.params = params
+
+
+class SnmpUnknownEngineId(SnmpAuthV3Exception):
+    pass
+
+
 class SnmpTimeoutError(SnmpException):
     message = "The requested SNMP operation timed out."
 
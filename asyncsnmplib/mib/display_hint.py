@@ -0,0 +1,115 @@
+from functools import lru_cache
+from typing import Callable
+
+# (repeat, length, format, separator, terminator)
+TSpec = tuple[bool, int, str, str, str]
+
+_FORMATS = 'dxoat'
+
+
+def _parse(hint: str) -> list[TSpec]:
+    """parses an OCTET STRING display hint (RFC 2579: 3.1)"""
+    specs: list[TSpec] = []
+    pos, n = 0, len(hint)
+    while pos < n:
+        repeat = hint[pos] == '*'
+        if repeat:
+            pos += 1
+        start = pos
+        while pos < n and hint[pos].isdigit():
+            pos += 1
+        if pos == start or pos == n or hint[pos] not in _FORMATS:
+            raise ValueError(f'Invalid display hint: {hint!r}')
+        length = int(hint[start:pos])
+        if length == 0:
+            raise ValueError(f'Invalid display hint: {hint!r}')
+        fmt = hint[pos]
+        pos += 1
+        sep = term = ''
+        if pos < n and hint[pos] != '*' and not hint[pos].isdigit():
+            sep = hint[pos]
+            pos += 1
+            if repeat and pos < n and hint[pos] != '*' and \
+                    not hint[pos].isdigit():
+                term = hint[pos]
+                pos += 1
+        specs.append((repeat, length, fmt, sep, term))
+    if not specs:
+        raise ValueError(f'Invalid display hint: {hint!r}')
+    return specs
+
+
+def _on_chunk(fmt: str, chunk: bytes) -> str:
+    if fmt == 'a':
+        return chunk.decode('ascii', 'ignore')
+    if fmt == 't':
+        return chunk.decode('utf-8', 'replace')
+    nr = int.from_bytes(chunk, 'big')
+    if fmt == 'd':
+        return str(nr)
+    if fmt == 'x':
+        return f'{nr:0{len(chunk) * 2}x}'
+    return f'{nr:o}'
+
+
+def _on_specs(specs: list[TSpec]) -> Callable[[bytes], str]:
+    last = len(specs) - 1
+
+    def conv(value: bytes) -> str:
+        out: list[str] = []
+        pos, n, i = 0, len(value), 0
+        while pos < n:
+            repeat, length, fmt, sep, term = specs[i]
+            if i < last:
+                i += 1
+            if repeat:
+                count = value[pos]
+                pos += 1
+                if count == 0 and term and pos < n:
+                    out.append(term)
+            else:
+                count = 1
+            for r in range(count):
+                if pos >= n:
+                    break
+                chunk = value[pos:pos + length]
+                pos += length
+                out.append(_on_chunk(fmt, chunk))
+                if pos >= n:
+                    break
+                if term and r == count - 1:
+                    out.append(term)
+                elif sep:
+                    out.append(sep)
+        return ''.join(out)
+    return conv
+
+
+@lru_cache(maxsize=None)
+def compile_display_hint(hint: str) -> Callable[[bytes], str]:
+    """returns a function which formats an OCTET STRING value according to
+    a DISPLAY-HINT, for example "1x:" or "2d-1d-1d,1d:1d:1d.1d,1a1d:1d";
+    raises ValueError when the hint is invalid"""
+    specs = _parse(hint)
+    if len(specs) > 1:
+        return _on_specs(specs)
+
+    repeat, length, fmt, sep, _ = specs[0]
+    if repeat:
+        return _on_specs(specs)
+
+    if fmt in 'at':
+        # the format is applied until the value is exhausted, without
+        # separators this is the same as formatting the value at once
+        if not sep:
+            encoding, errors = \
+                ('ascii', 'ignore') if fmt == 'a' else ('utf-8', 'replace')
+            return lambda value: value.decode(encoding, errors)
+        return _on_specs(specs)
+
+    if length == 1:
+        # for example "1x:" or "1d."
+        table = [_on_chunk(fmt, bytes((b, ))) for b in range(256)]
+        return lambda value: sep.join([table[b] for b in value])
+
+    return _on_specs(specs)
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Callable, Optional
 
 
 class NoMibError(Exception):
@@ -9,6 +9,64 @@ class NoNameError(Exception):
     pass
 
 
+class MibObject:
+    """MIB object in the MIB index.
+
+    Only the fields which are used for formatting are kept; other fields of
+    the parsed MIB (for example the description) are read from the MIB when
+    they are used. Fields can be accessed like dict items for compatibility
+    with the parsed MIB objects.
+    """
+    _FIELDS = (
+        'name', 'mib_name', 'tp', 'syntax', 'oid', 'index', 'augments')
+    __slots__ = _FIELDS + ('converter', )
+
+    # returns the parsed object from the MIB source, set by mib_index
+    loader: Optional[Callable[[str, str], dict[str, Any]]] = None
+
+    def __init__(self, name: str, mib_name: str, tp: str,
+                 syntax: Optional[dict[str, Any]], oid: tuple[int, ...],
+                 index: Optional[list[str]] = None,
+                 augments: Optional[str] = None):
+        self.name = name
+        self.mib_name = mib_name
+        self.tp = tp
+        self.syntax = syntax
+        self.oid = oid
+        self.index = index
+        self.augments = augments
+        # compiled converter of the syntax, set when used by utils
+        self.converter: Optional[Callable[[Any], Any]] = None
+
+    def __repr__(self):
+        return f'<MibObject {self.mib_name}::{self.name}>'
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif MibObject.loader is not None:
+            return MibObject.loader(self.mib_name, self.name)[key]
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_tuple(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, k) for k in self._FIELDS)
+
+
 def on_mib(mi: dict[Any, Any], mibname: str, mib: dict[str, Any],
            lk_definitions: dict[str, Any]):
     lk: dict[Any, Any] = {
@@ -69,6 +127,13 @@ def on_mib(mi: dict[Any, Any], mibname: str, mib: dict[str, Any],
                 if obj['syntax']['tp'] == 'TEXTUAL-CONVENTION':
                     obj['syntax'] = obj['syntax']['syntax']
 
+                # the display hint is kept with the syntax of the objects
+                # using this textual convention; custom textual conventions
+                # (lk_definitions) have precedence
+                hint = obj.get('display-hint')
+                if hint and obj['syntax']['tp'] == 'OCTET STRING':
+                    obj['syntax'] = {**obj['syntax'], 'display-hint': hint}
+
             lk_definitions[name] = obj
         elif obj['tp'] == 'TRAP-TYPE':
             lk_definitions[name] = obj
@@ -113,9 +178,13 @@ def on_mib(mi: dict[Any, Any], mibname: str, mib: dict[str, Any],
         oid_ = lk[other_name] + tuple(oid)
         lk[name] = oid_
 
-        obj['mib_name'] = mibname
-        obj['name'] = name
-        obj['oid'] = oid
-        mi[oid_] = obj
+        mi[oid_] = MibObject(
+            name,
+            mibname,
+            obj['tp'],
+            obj.get('syntax'),
+            oid_,
+            obj.get('index'),
+            obj.get('augments'))
 
     mi[mibname] = {**lk, None: lk_definitions}
@@ -1,31 +1,479 @@
-from typing import Any
+from typing import Any, Iterable, Optional
 import json
+import logging
+import marshal
 import os
-from .mib import on_mib
+import sys
+from ..version import __version__
+from functools import lru_cache
+from ..asn1 import TOid
+from .mib import MibObject, on_mib
+from .trie import OidTrie
 from .tc import MIB_TEXTUAL_CONVENTIONS
 
-MIB_INDEX: dict[Any, Any] = {}
-MIB_JSON_FOLDER = 'mibs/parsed/'
+# folders with parsed MIBs (<MIB name>.json); when a MIB is found in more
+# than one folder, the first folder wins
+MIB_PATH: list[str] = ['mibs/parsed/']
 
+# the resolved index of all MIBs is cached in this file (relative to the
+# first folder in MIB_PATH), use None to disable the cache
+MIB_CACHE_FILE: Optional[str] = '.mib_index.cache'
+_CACHE_FORMAT = 5
+
+# MIBs registered with register_mib() (JSON encoded, on_mib changes the
+# MIB) take precedence over the MIB_PATH
+_REGISTERED: dict[str, str] = {}
+_REGISTERED_SOURCE = '<registered>'
+
+# source of each loaded MIB, either a file or _REGISTERED_SOURCE
+_SOURCES: dict[str, str] = {}
+
+# MIB names which are not found and the owning MIB of each OID in the MIB
+# cache (None when there is no valid cache); both are kept as long as the
+# MIB sources are unchanged, see _check_sources()
+_sources_key: Optional[tuple[Any, ...]] = None
+_MISSING_MIBS: set[str] = set()
+_owners: Optional[dict[TOid, str]] = None
+_owners_read = False
+
+# RFC1213-MIB is obsoleted by SNMPv2-SMI
+# loaded definitions are updated by on_mib, therefore it is important
+# to first load old MIBS
+_BASE_MIBS = ('RFC1213-MIB', )
+
+
+class MibIndex(dict[Any, Any]):
+    """Index of MIB objects by OID and of MIB lookups by MIB name.
+
+    MIBs are loaded on demand: looking up a MIB name loads that MIB together
+    with the MIBs it imports. Looking up an unknown OID loads the MIB which
+    defines the OID according to the MIB cache or, without a valid cache,
+    all MIBs which are not loaded yet (once), unless `autoload` is disabled.
+    In that case only the MIBs loaded with `preload()` (or by name) are
+    known. Keys which are not found are remembered until the index or the
+    MIB sources change.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.autoload = True
+        self._complete = False
+        # all MIB objects by OID, for longest prefix lookups
+        self.trie = OidTrie()
+        # OID of each object name, when a name is defined in more than one
+        # MIB the last loaded MIB wins
+        self.names: dict[str, TOid] = {}
+        # incremented on each change, used to invalidate derived caches
+        self.generation = 0
+        # keys which are not found and the state for which this holds
+        self._missing: set[Any] = set()
+        self._missing_state: Optional[tuple[Any, ...]] = None
+
+    def __setitem__(self, key: Any, value: Any):
+        old = super().get(key)
+        if isinstance(old, MibObject) and self.names.get(old.name) == key:
+            del self.names[old.name]
+        super().__setitem__(key, value)
+        if isinstance(value, MibObject):
+            self.trie[key] = value
+            self.names[value.name] = key
+        self.generation += 1
+
+    def __delitem__(self, key: Any):
+        value = super().pop(key)
+        if isinstance(value, MibObject):
+            del self.trie[key]
+            if self.names.get(value.name) == key:
+                del self.names[value.name]
+        self.generation += 1
+
+    def update(self, other: dict[Any, Any]):  # type: ignore
+        for key, value in other.items():
+            self[key] = value
+
+    def __missing__(self, key: Any) -> Any:
+        if self._load_for(key) and self.is_loaded(key):
+            return super().__getitem__(key)
+        raise KeyError(key)
+
+    def __contains__(self, key: Any) -> bool:
+        return self.is_loaded(key) or (
+            self._load_for(key) and self.is_loaded(key))
+
+    def is_loaded(self, key: Any) -> bool:
+        """returns True when key is in the index, without loading MIBs"""
+        return super().__contains__(key)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def clear(self):
+        super().clear()
+        _SOURCES.clear()
+        self.trie.clear()
+        self.names.clear()
+        self.generation += 1
+        self._complete = False
+
+    def find(self, oid: TOid) -> Optional[tuple[MibObject, TOid]]:
+        """returns the MIB object with the longest OID which is a prefix of
+        oid and the remaining arcs (for example the index of a table cell),
+        or None
+
+        The MIB which defines the longest prefix according to the MIB cache
+        is loaded first or, without a valid cache, all MIBs, unless
+        autoload is disabled.
+        """
+        if not self._complete and self.autoload:
+            owners = _read_owners()
+            if owners is None:
+                load_all()
+            else:
+                for n in range(len(oid), 0, -1):
+                    owner = owners.get(oid[:n])
+                    if owner is not None:
+                        if not is_loaded(owner):
+                            _load_mibs([owner])
+                        break
+        return self.trie.longest_prefix(oid)
+
+    def find_name(self, name: str) -> Optional[TOid]:
+        """returns the OID of an object name (without MIB name), or None
+
+        All MIBs are loaded first when the name is unknown, unless autoload
+        is disabled.
+        """
+        oid = self.names.get(name)
+        if oid is None and not self._complete and self.autoload:
+            load_all()
+            oid = self.names.get(name)
+        return oid
+
+    def _load_for(self, key: Any) -> bool:
+        """loads the MIBs which might define key; returns True when one or
+        more MIBs are loaded"""
+        state = (self.generation, self.autoload, _check_sources())
+        if state != self._missing_state:
+            self._missing.clear()
+        elif key in self._missing:
+            return False
+
+        if isinstance(key, str):
+            if mib_exists(key):
+                read_mib(key)
+        elif not self._complete and self.autoload:
+            owners = _read_owners()
+            if owners is None:
+                load_all()
+            elif key in owners:
+                _load_mibs([owners[key]])
+
+        self._missing_state = (self.generation, self.autoload, state[2])
+        if not self.is_loaded(key):
+            self._missing.add(key)
+        return self.generation != state[0]
+
+
+MIB_INDEX = MibIndex()
+
+
+def _find_mib(mibname: str) -> Optional[str]:
+    if mibname in _REGISTERED:
+        return _REGISTERED_SOURCE
+    for folder in MIB_PATH:
+        fn = os.path.join(folder, mibname + '.json')
+        if os.path.isfile(fn):
+            return fn
+    return None
+
+
+def _check_sources() -> Optional[tuple[Any, ...]]:
+    """forgets the missing MIBs and the owners when the MIB sources are
+    changed; returns the key of the current sources"""
+    global _sources_key, _owners, _owners_read
+    key = (MIB_CACHE_FILE, tuple(MIB_PATH), tuple(_REGISTERED.items()))
+    if key != _sources_key:
+        _sources_key = key
+        _MISSING_MIBS.clear()
+        _owners = None
+        _owners_read = False
+    return _sources_key
+
+
+def mib_exists(mibname: str) -> bool:
+    _check_sources()
+    if mibname in _MISSING_MIBS:
+        return False
+    if _find_mib(mibname) is None:
+        _MISSING_MIBS.add(mibname)
+        return False
+    return True
+
+
+def mib_names() -> list[str]:
+    names = dict.fromkeys(_REGISTERED)
+    for folder in MIB_PATH:
+        names.update(dict.fromkeys(
+            fn[:-5] for fn in os.listdir(folder) if fn.endswith('.json')))
+    return list(names)
+
+
+def is_loaded(mibname: str) -> bool:
+    return MIB_INDEX.is_loaded(mibname)
+
+
+def _parse_mib(mibname: str) -> tuple[str, dict[str, Any]]:
+    """returns the source and the parsed MIB"""
+    source = _find_mib(mibname)
+    if source is None:
+        raise FileNotFoundError(f'MIB {mibname} not found')
+    if source == _REGISTERED_SOURCE:
+        return source, json.loads(_REGISTERED[mibname])
+    with open(source) as f:
+        return source, json.load(f)
 
-def read_mib(mibname: str):
-    with open(os.path.join(MIB_JSON_FOLDER, mibname + '.json')) as f:
-        mib = json.load(f)
+
+@lru_cache(maxsize=4)
+def _parsed_mib(mibname: str) -> dict[str, Any]:
+    _, mib = _parse_mib(mibname)
+    return mib
+
+
+def _load_object(mibname: str, name: str) -> dict[str, Any]:
+    """returns a parsed object, used for the fields which are not kept in
+    the MIB index"""
+    return _parsed_mib(mibname)[name]
+
+
+MibObject.loader = _load_object
+
+
+def _read_mib(mibname: str):
+    _parsed_mib.cache_clear()
+    source, mib = _parse_mib(mibname)
 
     for imibname, _ in mib['IMPORTS']:
-        if imibname not in MIB_INDEX:
-            read_mib(imibname)
+        if not is_loaded(imibname):
+            _read_mib(imibname)
 
     # custom TEXTUAL CONVENTIONS
-    lk_definitions = MIB_TEXTUAL_CONVENTIONS.get(mibname, {})
+    lk_definitions = dict(MIB_TEXTUAL_CONVENTIONS.get(mibname, {}))
     on_mib(MIB_INDEX, mibname, mib, lk_definitions)
+    _SOURCES[mibname] = source
 
 
-# RFC1213-MIB is obsoleted by SNMPv2-SMI
-# loaded definitions are updated by on_mib, therefore it is important
-# to first load old MIBS
-read_mib('RFC1213-MIB')
+def read_mib(mibname: str):
+    """loads a MIB and the MIBs it imports, when not loaded yet"""
+    for name in _BASE_MIBS:
+        if not is_loaded(name) and mib_exists(name):
+            _read_mib(name)
+    if not is_loaded(mibname):
+        _read_mib(mibname)
+
+
+def _reload_mib(mibname: str):
+    """replaces the objects of a loaded MIB; MIBs which import the MIB are
+    not reloaded"""
+    stale: list[Any] = [
+        oid for oid, obj in MIB_INDEX.items()
+        if isinstance(obj, MibObject) and obj.mib_name == mibname]
+    for oid in stale:
+        del MIB_INDEX[oid]
+    del MIB_INDEX[mibname]
+    _read_mib(mibname)
+
+
+def _update():
+    """incremental update after the MIB sources are changed; MIBs which now
+    have another source are reloaded and, when all MIBs were loaded, new
+    MIBs are loaded as well"""
+    for mibname, source in list(_SOURCES.items()):
+        new_source = _find_mib(mibname)
+        if new_source is not None and new_source != source:
+            _reload_mib(mibname)
+    if MIB_INDEX._complete:
+        _load_mibs(mib_names())
+
+
+def set_mib_path(*folders: str):
+    """sets the folders with parsed MIBs, in order of precedence"""
+    MIB_PATH[:] = folders
+    _update()
+
+
+def add_mib_dir(folder: str):
+    """adds a folder with precedence over the folders in MIB_PATH, for
+    example with vendor MIBs"""
+    MIB_PATH.insert(0, folder)
+    _update()
+
+
+def register_mib(mibname: str, mib: dict[str, Any]):
+    """registers a parsed MIB (as read from JSON) which takes precedence
+    over the MIB_PATH; a loaded MIB with the same name is replaced"""
+    _REGISTERED[mibname] = json.dumps(mib)
+    if is_loaded(mibname):
+        _reload_mib(mibname)
+    elif MIB_INDEX._complete:
+        read_mib(mibname)
+
+
+def preload(mibnames: Iterable[str]):
+    """loads the given MIBs (and their imports); use together with
+    `MIB_INDEX.autoload = False` to limit the index to these MIBs"""
+    for mibname in mibnames:
+        read_mib(mibname)
+
+
+def _cache_path() -> Optional[str]:
+    if MIB_CACHE_FILE is None or not MIB_PATH:
+        return None
+    return os.path.join(MIB_PATH[0], MIB_CACHE_FILE)
+
+
+def _cache_key(mibnames: list[str]) -> tuple[Any, ...]:
+    """the cache is valid as long as the source files, the custom textual
+    conventions and the versions are unchanged"""
+    sources: list[tuple[str, Any, Any]] = []
+    for mibname in sorted(mibnames):
+        source = _find_mib(mibname)
+        if source == _REGISTERED_SOURCE:
+            sources.append((mibname, source, _REGISTERED[mibname]))
+        elif source is not None:
+            st = os.stat(source)
+            sources.append((source, st.st_mtime_ns, st.st_size))
+    return (
+        _CACHE_FORMAT,
+        __version__,
+        tuple(sys.version_info[:2]),
+        MIB_TEXTUAL_CONVENTIONS,
+        tuple(sources),
+    )
+
+
+def _read_owners() -> Optional[dict[TOid, str]]:
+    """returns the owning MIB of each OID in the MIB cache, or None when
+    there is no valid cache; the cache is only read once for the current
+    MIB sources"""
+    global _owners, _owners_read
+    _check_sources()
+    if _owners_read:
+        return _owners
+    _owners_read = True
+    _owners = None
+    path = _cache_path()
+    if path is None:
+        return None
+    try:
+        mibnames = mib_names()
+        with open(path, 'rb') as f:
+            # the owners are stored before the index (which is not read)
+            if marshal.load(f) == _cache_key(mibnames):
+                _owners = marshal.load(f)
+    except Exception:
+        # a corrupt cache is reported by load_all()
+        pass
+    return _owners
+
+
+def _load_cache(mibnames: list[str]) -> bool:
+    path = _cache_path()
+    if path is None:
+        return False
+    try:
+        with open(path, 'rb') as f:
+            # key, owners and index are stored one after the other
+            if marshal.load(f) != _cache_key(mibnames):
+                return False
+            marshal.load(f)
+            index = marshal.load(f)
+        # MIB objects are stored as tuple
+        objs: dict[Any, Any] = index
+        for k, v in objs.items():
+            if isinstance(v, tuple):
+                fields: tuple[Any, ...] = v  # type: ignore
+                objs[k] = MibObject(*fields)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        msg = str(e) or type(e).__name__
+        logging.warning(f'Failed to read MIB cache {path}: {msg}')
+        return False
+    MIB_INDEX.update(index)
+    for mibname in mibnames:
+        source = _find_mib(mibname)
+        if source is not None:
+            _SOURCES[mibname] = source
+    return True
+
+
+def _store_cache(mibnames: list[str]):
+    global _owners_read
+    path = _cache_path()
+    if path is None:
+        return
+    tmp = f'{path}.tmp'
+    try:
+        owners = {
+            k: v.mib_name for k, v in MIB_INDEX.items()
+            if isinstance(v, MibObject)}
+        index = {
+            k: v.to_tuple() if isinstance(v, MibObject) else v
+            for k, v in MIB_INDEX.items()}
+        data = marshal.dumps(_cache_key(mibnames)) + \
+            marshal.dumps(owners) + marshal.dumps(index)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        _owners_read = False
+    except Exception as e:
+        msg = str(e) or type(e).__name__
+        logging.warning(f'Failed to write MIB cache {path}: {msg}')
+
+
+def _load_mibs(mibnames: list[str]) -> bool:
+    """loads the MIBs which are not loaded yet; returns False when one or
+    more MIBs failed to load"""
+    success = True
+    for mibname in mibnames:
+        try:
+            read_mib(mibname)
+        except Exception as e:
+            msg = str(e) or type(e).__name__
+            logging.error(f'Failed to load MIB {mibname}: {msg}')
+            success = False
+    return success
+
+
+def load_all(use_cache: bool = True):
+    """loads all MIBs in MIB_PATH and all registered MIBs
+
+    The resolved index is read from the MIB cache when it is up to date,
+    otherwise the MIBs are loaded from JSON and the cache is written.
+    """
+    MIB_INDEX._complete = True
+    try:
+        mibnames = mib_names()
+    except OSError as e:
+        logging.error(f'Failed to list MIBs: {e}')
+        return
+    if use_cache and _load_cache(mibnames):
+        return
+    if _load_mibs(mibnames):
+        _store_cache(mibnames)
+
+
+def build_cache():
+    """(re)builds the MIB cache from the MIBs in MIB_PATH"""
+    MIB_INDEX.clear()
+    load_all(use_cache=False)
+
 
-for fn in os.listdir(MIB_JSON_FOLDER):
-    if fn[:-5] not in MIB_INDEX:
-        read_mib(fn[:-5])
+if __name__ == '__main__':
+    # build step: python -m asyncsnmplib.mib.mib_index [FOLDER ...]
+    if len(sys.argv) > 1:
+        set_mib_path(*sys.argv[1:])
+    build_cache()
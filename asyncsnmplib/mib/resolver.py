@@ -0,0 +1,88 @@
+from functools import lru_cache
+from ..asn1 import TOid
+from ..oid import oid_to_str
+from .mib import NoNameError
+from .mib_index import MIB_INDEX
+
+# names and OIDs used by configuration and result labelling are resolved
+# over and over again; the caches are keyed by the generation of the MIB
+# index and therefore never return a result of a previous index
+RESOLVER_CACHE_SIZE = 4096
+
+# roots which are not defined by any MIB
+_ROOTS: dict[str, TOid] = {
+    'ccitt': (0, ),
+    'iso': (1, ),
+    'joint-iso-ccitt': (2, ),
+    'iso-ccitt': (2, ),
+}
+
+
+def _parse_arcs(text: str, parts: list[str]) -> TOid:
+    try:
+        arcs = tuple(map(int, parts))
+    except ValueError:
+        raise ValueError(f'Invalid OID: {text}')
+    if any(arc < 0 for arc in arcs):
+        raise ValueError(f'Invalid OID: {text}')
+    return arcs
+
+
+@lru_cache(maxsize=RESOLVER_CACHE_SIZE)
+def _resolve(text: str, generation: int) -> TOid:
+    mibname, _, symbol = text.rpartition('::')
+    if symbol.startswith('.'):
+        symbol = symbol[1:]
+    parts = symbol.split('.')
+    name = parts[0]
+    if not name:
+        raise ValueError(f'Invalid OID: {text}')
+
+    if name.isdigit() and not mibname:
+        return _parse_arcs(text, parts)
+
+    idx = _parse_arcs(text, parts[1:])
+    if mibname:
+        lk = MIB_INDEX.get(mibname)
+        if lk is None:
+            raise NoNameError(f'MIB {mibname} not found')
+        oid = lk.get(name)
+    else:
+        oid = _ROOTS.get(name) or MIB_INDEX.find_name(name)
+    if not isinstance(oid, tuple):
+        raise NoNameError(f'Name {name} not found: {text}')
+    base: TOid = oid  # type: ignore
+    return base + idx
+
+
+def resolve(text: str) -> TOid:
+    """returns the OID of a symbolic or numeric OID
+
+    Accepted are `MIB::name[.index]` (for example `IF-MIB::ifHCInOctets.12`),
+    `name[.index]` and dotted OIDs (`1.3.6.1.2.1.1.1.0`, optional with a
+    leading dot). Raises NoNameError when a MIB or name is unknown and
+    ValueError when the OID is malformed.
+    """
+    return _resolve(text, MIB_INDEX.generation)
+
+
+@lru_cache(maxsize=RESOLVER_CACHE_SIZE)
+def _oid_to_name(oid: TOid, with_mib: bool, generation: int) -> str:
+    found = MIB_INDEX.find(oid)
+    if found is None:
+        return oid_to_str(oid)
+    obj, idx = found
+    name = f'{obj.mib_name}::{obj.name}' if with_mib else obj.name
+    return f'{name}.{".".join(map(str, idx))}' if idx else name
+
+
+def oid_to_name(oid: TOid, with_mib: bool = False) -> str:
+    """returns the symbolic name of an OID, for example `ifHCInOctets.12`
+    (or `IF-MIB::ifHCInOctets.12` when with_mib is True); an OID without a
+    known object is returned in dotted notation"""
+    return _oid_to_name(oid, with_mib, MIB_INDEX.generation)
+
+
+def resolver_cache_clear():
+    _resolve.cache_clear()
+    _oid_to_name.cache_clear()
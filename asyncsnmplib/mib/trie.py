@@ -0,0 +1,103 @@
+from typing import Any, Iterator, Optional
+from ..asn1 import TOid
+
+
+class _Node:
+    __slots__ = ('obj', 'children')
+
+    def __init__(self):
+        self.obj: Any = None
+        self.children: dict[int, _Node] = {}
+
+
+class OidTrie:
+    """Trie of OIDs with one level per arc.
+
+    `longest_prefix` resolves an instance OID (for example a table cell) to
+    the object with the longest matching OID and the instance suffix in a
+    single walk, without slicing and hashing OID prefixes.
+    """
+    __slots__ = ('_root', '_size')
+
+    def __init__(self):
+        self._root = _Node()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __setitem__(self, oid: TOid, obj: Any):
+        assert obj is not None
+        node = self._root
+        for arc in oid:
+            child = node.children.get(arc)
+            if child is None:
+                child = node.children[arc] = _Node()
+            node = child
+        if node.obj is None:
+            self._size += 1
+        node.obj = obj
+
+    def __delitem__(self, oid: TOid):
+        path: list[tuple[_Node, int]] = []
+        node = self._root
+        for arc in oid:
+            path.append((node, arc))
+            node = node.children.get(arc)  # type: ignore
+            if node is None:
+                raise KeyError(oid)
+        if node.obj is None:
+            raise KeyError(oid)
+        node.obj = None
+        self._size -= 1
+        # remove nodes which are no longer used
+        for parent, arc in reversed(path):
+            child = parent.children[arc]
+            if child.obj is not None or child.children:
+                break
+            del parent.children[arc]
+
+    def get(self, oid: TOid) -> Any:
+        node = self._root
+        for arc in oid:
+            node = node.children.get(arc)  # type: ignore
+            if node is None:
+                return None
+        return node.obj
+
+    def longest_prefix(self, oid: TOid) -> Optional[tuple[Any, TOid]]:
+        """returns the object with the longest OID which is a prefix of oid
+        (or oid itself) and the remaining arcs, or None"""
+        found = None
+        depth = 0
+        node = self._root
+        for i, arc in enumerate(oid):
+            node = node.children.get(arc)  # type: ignore
+            if node is None:
+                break
+            if node.obj is not None:
+                found = node.obj
+                depth = i + 1
+        if found is None:
+            return None
+        return found, oid[depth:]
+
+    def items(self, prefix: TOid = ()) -> Iterator[tuple[TOid, Any]]:
+        """yields (oid, obj) for all objects below prefix (in OID order)"""
+        node = self._root
+        for arc in prefix:
+            node = node.children.get(arc)  # type: ignore
+            if node is None:
+                return
+        stack = [(prefix, node)]
+        while stack:
+            oid, node = stack.pop()
+            if node.obj is not None:
+                yield oid, node.obj
+            stack.extend(
+                ((*oid, arc), child)
+                for arc, child in sorted(node.children.items(), reverse=True))
+
+    def clear(self):
+        self._root = _Node()
+        self._size = 0
@@ -1,5 +1,11 @@
-from typing import Union, Any
+import ipaddress
+import logging
+from functools import lru_cache
+from typing import Callable, Optional, Union, Any
 from ..asn1 import TOid, TValue
+from ..oid import oid_to_str
+from .display_hint import compile_display_hint
+from .mib import MibObject
 from .mib_index import MIB_INDEX
 from .syntax_funs import SYNTAX_FUNS
 
@@ -34,7 +40,8 @@ def on_oid_map(oid: TOid) -> Union[str, None]:
         # translation func
         return
     # translation.name is always str
-    return MIB_INDEX.get(oid, {}).get('name', '.'.join(map(str, oid)))
+    mib_object = MIB_INDEX.get(oid)
+    return oid_to_str(oid) if mib_object is None else mib_object['name']
 
 
 def on_value_map(value: int, map_: dict[int, str]) -> Union[str, None]:
@@ -46,38 +53,302 @@ def on_value_map_b(value: bytes, map_: dict[int, str]) -> str:
         v for k, v in map_.items() if value[k // 8] & (1 << k % 8))
 
 
-def on_syntax(syntax: dict[str, Any], value: TValue):
+def on_other(value: TValue) -> Any:
     """
-    this is point where bytes are converted to right datatype
+    used when a value is not of the type of the syntax; some devices don't
+    follow the MIB's syntax, for example ipAddressTable.ipAddressPrefix
+    returns an int in case of old ups firmware versions, the value is then
+    converted by its type (the tag in the response)
     """
-    if syntax['tp'] == 'CUSTOM':
-        return SYNTAX_FUNS[syntax['func']](value)
-    elif syntax['tp'] == 'OCTET STRING':
+    if isinstance(value, int):
+        return value
+    if isinstance(value, bytes):
         return on_octet_string(value)
-    elif syntax['tp'] == 'OBJECT IDENTIFIER':
-        return on_oid_map(value)
-    elif syntax['tp'] == 'BITS':
-        return on_value_map_b(value, syntax['values'])
-    elif syntax['tp'] == 'INTEGER' and syntax.get('values'):
-        return on_value_map(value, syntax['values'])
-    elif syntax['tp'] == 'INTEGER':
-        return on_integer(value)
-    else:
+    if isinstance(value, tuple):
+        return on_oid_map(value)  # type: ignore
+    return None
+
+
+def _on_invalid(syntax: dict[str, Any]) -> Callable[[TValue], Any]:
+    def conv(value: TValue):
         raise Exception(f'Invalid syntax {syntax}')
+    return conv
 
 
-def on_result(
-    base_oid: TOid,
-    result: list[tuple[TOid, TValue]],
-) -> tuple[str, list[dict[str, TValue]]]:
-    """returns a more compat result (w/o prefixes) and groups formatted
-    metrics by base_oid
+def _on_enum(map_: dict[int, str]) -> Callable[[TValue], Any]:
+    get = map_.get
+
+    def conv(value: TValue):
+        if isinstance(value, int):
+            return get(value, ENUM_UNKNOWN)
+        return on_other(value)
+    return conv
+
+
+def _on_bits(map_: dict[int, str]) -> Callable[[TValue], Any]:
+    bits = tuple((k // 8, 1 << k % 8, v) for k, v in map_.items())
+
+    def conv(value: TValue):
+        if not isinstance(value, bytes):
+            return on_other(value)
+        # trailing octets without flags might be left out by the agent
+        n = len(value)
+        return FLAGS_SEPERATOR.join(
+            v for i, mask, v in bits if i < n and value[i] & mask)
+    return conv
+
+
+def _on_type(tp: type, fun: Callable[[Any], Any]) -> Callable[[TValue], Any]:
+    def conv(value: TValue):
+        if isinstance(value, tp):
+            return fun(value)
+        return on_other(value)
+    return conv
+
+
+# value type of the CUSTOM syntax functions (bytes when not listed);
+# TimeTicks handles values of any type itself
+_CUSTOM_TYPES: dict[str, type] = {'TimeTicks': object, 'TruthValue': int}
+
+
+def compile_syntax(syntax: dict[str, Any]) -> Callable[[TValue], Any]:
+    """returns a function which converts a value of the given syntax
+
+    Enum and BITS maps and display hints are bound to the function, a value
+    which is not of the type of the syntax is converted with on_other.
     """
-    base = MIB_INDEX[base_oid]
-    base_name = result_name = base['name']
-    prefixlen = len(base_oid) + 1
+    tp = syntax['tp']
+    if tp == 'CUSTOM':
+        func = syntax['func']
+        fun = SYNTAX_FUNS.get(func)
+        if fun is None:
+            return _on_invalid(syntax)
+        value_tp = _CUSTOM_TYPES.get(func, bytes)
+        return fun if value_tp is object else _on_type(value_tp, fun)
+    if tp == 'OCTET STRING':
+        hint = syntax.get('display-hint')
+        if hint:
+            try:
+                return _on_type(bytes, compile_display_hint(hint))
+            except ValueError as e:
+                logging.warning(e)
+        return _on_type(bytes, on_octet_string)
+    if tp == 'OBJECT IDENTIFIER':
+        return _on_type(tuple, on_oid_map)
+    if tp == 'BITS':
+        return _on_bits(syntax['values'])
+    if tp == 'INTEGER' and syntax.get('values'):
+        return _on_enum(syntax['values'])
+    if tp == 'INTEGER':
+        return _on_type(int, on_integer)
+    return _on_invalid(syntax)
+
+
+def get_converter(obj: MibObject) -> Callable[[TValue], Any]:
+    """returns the compiled converter of a MIB object"""
+    conv = obj.converter
+    if conv is None:
+        conv = obj.converter = compile_syntax(obj['syntax'])
+    return conv
+
+
+def on_syntax(syntax: dict[str, Any], value: TValue):
+    """
+    this is point where bytes are converted to right datatype; use
+    compile_syntax (or get_converter) when values of the same syntax are
+    converted more than once
+    """
+    return compile_syntax(syntax)(value)
+
+
+# compiled plans and index decoders by base OID; the generation of the MIB
+# index is part of the key so these are compiled again after MIBs are
+# (re)loaded
+PLAN_CACHE_SIZE = 256
+
+# column arc -> (name, converter)
+TPlan = dict[int, tuple[str, Callable[[TValue], Any]]]
+
+
+# CUSTOM syntaxes of INTEGER values and of fixed size OCTET STRING values
+_INTEGER_FUNCS = {'TimeTicks', 'TruthValue'}
+_FIXED_SIZE_FUNCS = {'IpAddress': 4, 'MacAddress': 6, 'Ipv6Address': 16}
+
+# InetAddressType (RFC 4001) values
+_INET_ADDRESS_TYPES = {'ipv4', 'ipv6'}
+
+# decodes an index object from the arcs at the given position, the value is
+# appended to the values; returns the new position
+TIndexPart = Callable[[TOid, int, list[Any]], int]
+
+
+def _octets(idx: TOid, pos: int, size: int) -> bytes:
+    if pos + size > len(idx):
+        raise ValueError('index too short')
+    return bytes(idx[pos:pos + size])
+
+
+def _index_integer(conv: Callable[[TValue], Any]) -> TIndexPart:
+    def part(idx: TOid, pos: int, values: list[Any]) -> int:
+        values.append(conv(idx[pos]))
+        return pos + 1
+    return part
+
+
+def _index_fixed(size: int, conv: Callable[[TValue], Any]) -> TIndexPart:
+    def part(idx: TOid, pos: int, values: list[Any]) -> int:
+        values.append(conv(_octets(idx, pos, size)))
+        return pos + size
+    return part
+
+
+def _index_octets(implied: bool,
+                  conv: Callable[[TValue], Any]) -> TIndexPart:
+    def part(idx: TOid, pos: int, values: list[Any]) -> int:
+        if implied:
+            size = len(idx) - pos
+        else:
+            size = idx[pos]
+            pos += 1
+        values.append(conv(_octets(idx, pos, size)))
+        return pos + size
+    return part
+
+
+def _index_oid(implied: bool, conv: Callable[[TValue], Any]) -> TIndexPart:
+    def part(idx: TOid, pos: int, values: list[Any]) -> int:
+        if implied:
+            size = len(idx) - pos
+        else:
+            size = idx[pos]
+            pos += 1
+        if pos + size > len(idx):
+            raise ValueError('index too short')
+        values.append(conv(idx[pos:pos + size]))
+        return pos + size
+    return part
+
 
-    if base_name.endswith('XEntry'):
+def _on_inet_address(tp: Any, octets: bytes) -> Any:
+    if tp in ('ipv4', 'ipv4z') and len(octets) in (4, 8):
+        address = str(ipaddress.IPv4Address(octets[:4]))
+    elif tp in ('ipv6', 'ipv6z') and len(octets) in (16, 20):
+        address = str(ipaddress.IPv6Address(octets[:16]))
+    elif tp == 'dns':
+        return octets.decode('ascii', 'ignore')
+    else:
+        return on_octet_string(octets)
+    if len(octets) in (8, 20):
+        # zone index
+        address += f'%{int.from_bytes(octets[-4:], "big")}'
+    return address
+
+
+def _index_inet_address(implied: bool) -> TIndexPart:
+    """InetAddress index, formatted by the preceding InetAddressType"""
+    def part(idx: TOid, pos: int, values: list[Any]) -> int:
+        if implied:
+            size = len(idx) - pos
+        else:
+            size = idx[pos]
+            pos += 1
+        values.append(_on_inet_address(values[-1], _octets(idx, pos, size)))
+        return pos + size
+    return part
+
+
+def _lookup(mibname: str, name: str) -> Optional[MibObject]:
+    lk: dict[Any, Any] = MIB_INDEX.get(mibname) or {}
+    oid: Optional[TOid] = lk.get(name) or MIB_INDEX.find_name(name)
+    return None if oid is None else MIB_INDEX.get(oid)
+
+
+def _index_parts(entry: MibObject) -> Optional[list[TIndexPart]]:
+    if entry.augments:
+        # AUGMENTS tables have the index of the augmented table
+        entry_ = _lookup(entry.mib_name, entry.augments)
+        if entry_ is None or entry_.augments:
+            return None
+        entry = entry_
+    if not entry.index:
+        return None
+
+    parts: list[TIndexPart] = []
+    inet_type = False
+    last = len(entry.index) - 1
+    for i, name in enumerate(entry.index):
+        implied = name.startswith('IMPLIED ')
+        if implied:
+            if i != last:
+                return None
+            name = name[8:].strip()
+        obj = _lookup(entry.mib_name, name)
+        if obj is None or obj.syntax is None:
+            return None
+        syntax = obj.syntax
+        tp = syntax['tp']
+        conv = get_converter(obj)
+        if tp == 'OCTET STRING' and inet_type:
+            parts.append(_index_inet_address(implied))
+        elif tp == 'OCTET STRING' or tp == 'BITS':
+            parts.append(_index_octets(implied, conv))
+        elif tp == 'OBJECT IDENTIFIER':
+            parts.append(_index_oid(implied, conv))
+        elif tp == 'INTEGER':
+            parts.append(_index_integer(conv))
+        elif tp == 'CUSTOM' and syntax['func'] in _INTEGER_FUNCS:
+            parts.append(_index_integer(conv))
+        elif tp == 'CUSTOM' and syntax['func'] in _FIXED_SIZE_FUNCS:
+            size = _FIXED_SIZE_FUNCS[syntax['func']]
+            parts.append(_index_fixed(size, conv))
+        elif tp == 'CUSTOM':
+            parts.append(_index_octets(implied, conv))
+        else:
+            return None
+        inet_type = tp == 'INTEGER' and \
+            _INET_ADDRESS_TYPES.issubset(syntax.get('values', {}).values())
+    return parts
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile_index(entry_oid: TOid,
+                   generation: int) -> Callable[[TOid], tuple[Any, ...]]:
+    entry = MIB_INDEX.get(entry_oid)
+    parts = None if entry is None else _index_parts(entry)
+    if parts is None:
+        return tuple
+
+    def decode(idx: TOid) -> tuple[Any, ...]:
+        values: list[Any] = []
+        pos = 0
+        try:
+            for part in parts:
+                pos = part(idx, pos, values)
+        except (IndexError, ValueError):
+            return idx
+        # an index which does not match the INDEX clause is not decoded
+        return tuple(values) if pos == len(idx) else idx
+    return decode
+
+
+def compile_index(entry_oid: TOid) -> Callable[[TOid], tuple[Any, ...]]:
+    """returns a function which decodes the index of a row of a table entry
+    into typed values according to the INDEX (or AUGMENTS) clause, for
+    example `(6, 'ipv4', '10.0.0.1')`; an index which cannot be decoded is
+    returned as is"""
+    if not MIB_INDEX.is_loaded(entry_oid):
+        MIB_INDEX.get(entry_oid)
+    return _compile_index(entry_oid, MIB_INDEX.generation)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile_plan(base_oid: TOid, strip: bool,
+                  generation: int) -> tuple[str, TPlan]:
+    base_name = result_name = MIB_INDEX[base_oid]['name']
+
+    if not strip:
+        pass
+    elif base_name.endswith('XEntry'):
         # for SEQUENCE types with AUGMENTS clause remove suffix
         result_name = base_name[:-5]
         base_name = base_name[:-6]
@@ -85,58 +356,83 @@ def on_result(
         # for SEQUENCE types remove suffix
         base_name = result_name = base_name[:-5]
 
-    table: dict[TOid, dict[str, TValue]] = {}
-    for oid, value in result:
-        idx = oid[prefixlen:]
-        prefix = oid[:prefixlen]
-        if prefix not in MIB_INDEX:
-            continue
-        tp = MIB_INDEX[prefix]['tp']
-        if tp != 'OBJECT-TYPE':
+    depth = len(base_oid) + 1
+    plan: TPlan = {}
+    for oid, obj in MIB_INDEX.trie.items(base_oid):
+        if len(oid) != depth or obj.tp != 'OBJECT-TYPE':
             continue
-        name = MIB_INDEX[prefix]['name']
-        _, _, lastpart = name.partition(base_name)
-        name = lastpart or name
+        name = obj.name
+        if strip:
+            _, _, lastpart = name.partition(base_name)
+            name = lastpart or name
+        plan[oid[-1]] = (name, get_converter(obj))
+    return result_name, plan
 
-        syntax = MIB_INDEX[prefix]['syntax']
-        if idx not in table:
-            table[idx] = {'name': '.'.join(map(str, idx))}
-        try:
-            table[idx][name] = on_syntax(syntax, value)
-        except Exception as e:
-            raise Exception('Something went wrong in the metric processor:'
-                            f' {e.__class__.__name__}: {e}')
 
-    return result_name, list(table.values())
+def compile_plan(base_oid: TOid, strip: bool = True) -> tuple[str, TPlan]:
+    """returns the result name and the formatter plan of the columns of
+    base_oid; with strip the names are without the base name prefix (as
+    used by on_result)"""
+    if not MIB_INDEX.is_loaded(base_oid):
+        # load the MIBs first, this changes the generation
+        MIB_INDEX[base_oid]
+    return _compile_plan(base_oid, strip, MIB_INDEX.generation)
 
 
-def on_result_base(
+def _on_plan(
     base_oid: TOid,
     result: list[tuple[TOid, TValue]],
+    strip: bool,
+    typed_index: bool,
 ) -> tuple[str, list[dict[str, TValue]]]:
-    """returns formatted metrics grouped by base_oid
-    """
-    base = MIB_INDEX[base_oid]
-    result_name = base['name']
-    prefixlen = len(base_oid) + 1
+    result_name, plan = compile_plan(base_oid, strip)
+    decode = compile_index(base_oid) if typed_index else None
+    column = len(base_oid)
+    prefixlen = column + 1
 
     table: dict[TOid, dict[str, TValue]] = {}
     for oid, value in result:
-        idx = oid[prefixlen:]
-        prefix = oid[:prefixlen]
-        if prefix not in MIB_INDEX:
+        # the OID after base_oid is the column; an agent might return OIDs
+        # outside the walked table (or too short) which are skipped
+        if len(oid) <= column or oid[:column] != base_oid:
             continue
-        tp = MIB_INDEX[prefix]['tp']
-        if tp != 'OBJECT-TYPE':
+        fmt = plan.get(oid[column])
+        if fmt is None:
             continue
-        name = MIB_INDEX[prefix]['name']
-        syntax = MIB_INDEX[prefix]['syntax']
-        if idx not in table:
-            table[idx] = {'name': '.'.join(map(str, idx))}
+        name, conv = fmt
+        idx = oid[prefixlen:]
+        row = table.get(idx)
+        if row is None:
+            row = table[idx] = {'name': '.'.join(map(str, idx))}
+            if decode is not None:
+                row['index'] = decode(idx)
         try:
-            table[idx][name] = on_syntax(syntax, value)
+            row[name] = conv(value)
         except Exception as e:
             raise Exception('Something went wrong in the metric processor:'
                             f' {e.__class__.__name__}: {e}')
 
     return result_name, list(table.values())
+
+
+def on_result(
+    base_oid: TOid,
+    result: list[tuple[TOid, TValue]],
+    typed_index: bool = False,
+) -> tuple[str, list[dict[str, TValue]]]:
+    """returns a more compat result (w/o prefixes) and groups formatted
+    metrics by base_oid; with typed_index each row has the decoded index
+    (see compile_index)
+    """
+    return _on_plan(base_oid, result, True, typed_index)
+
+
+def on_result_base(
+    base_oid: TOid,
+    result: list[tuple[TOid, TValue]],
+    typed_index: bool = False,
+) -> tuple[str, list[dict[str, TValue]]]:
+    """returns formatted metrics grouped by base_oid; with typed_index each
+    row has the decoded index (see compile_index)
+    """
+    return _on_plan(base_oid, result, False, typed_index)
@@ -0,0 +1,59 @@
+from functools import lru_cache
+from typing import Any
+from .asn1 import TOid, encode_length
+
+# the working set of OIDs of a poller is small, these caches are shared by
+# all clients in the process; row indexes are not part of the working set
+# and should not be formatted with oid_to_str as they evict the OIDs which
+# are used over and over again
+OID_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=OID_CACHE_SIZE)
+def oid_to_str(oid: TOid) -> str:
+    return '.'.join(map(str, oid))
+
+
+@lru_cache(maxsize=OID_CACHE_SIZE)
+def oid_to_ber(oid: TOid) -> bytes:
+    """returns the BER encoded OBJECT IDENTIFIER (tag, length and value)"""
+    if len(oid) < 2:
+        raise ValueError('Not a valid Object Identifier')
+    if oid[0] > 2:
+        raise ValueError('First component must be 0, 1 or 2')
+    if oid[0] < 2 and oid[1] > 39:
+        raise ValueError('Second component must be 39 at most')
+
+    encoded = bytearray()
+    for arc in (40 * oid[0] + oid[1], *oid[2:]):
+        if arc < 0x80:
+            encoded.append(arc)
+            continue
+        chunk = bytearray((arc & 0x7F, ))
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        chunk.reverse()
+        encoded += chunk
+    return b'\x06' + encode_length(len(encoded)) + encoded
+
+
+def oid_cache_stats() -> dict[str, dict[str, Any]]:
+    stats: dict[str, dict[str, Any]] = {}
+    for name, fun in (('str', oid_to_str), ('ber', oid_to_ber)):
+        info = fun.cache_info()
+        lookups = info.hits + info.misses
+        stats[name] = {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize,
+            'hit_rate': info.hits / lookups if lookups else 0.0,
+        }
+    return stats
+
+
+def oid_cache_clear():
+    oid_to_str.cache_clear()
+    oid_to_ber.cache_clear()
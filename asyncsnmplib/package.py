@@ -1,6 +1,6 @@
-from Crypto.Util.asn1 import DerSequence, DerOctetString
+from Crypto.Util.asn1 import DerSequence, DerOctetString, DerInteger
 from typing import Optional
-from .asn1 import Decoder, Tag, TOid, TValue
+from .asn1 import Decoder, Tag, TOid, TValue, encode_length
 from .pdu import PDU
 
 
@@ -56,3 +56,51 @@ class SnmpMessage(Package):
         pkg.community = community
         pkg.pdu = pdu
         return pkg
+
+
+def _strip_header(encoded: bytes) -> bytes:
+    """returns the contents octets of a DER encoded object"""
+    size = encoded[1]
+    if size & 0x80:
+        return encoded[2 + (size & 0x7F):]
+    return encoded[2:]
+
+
+class SnmpPreparedMessage:
+    """A v1/v2c message which is encoded only once.
+
+    Only the request-id differs between two sends of the same request, so
+    everything before and after the request-id is kept as bytes. The outer
+    length fields depend on the width of the encoded request-id; the header
+    for each width is built once and then reused.
+    """
+    __slots__ = ('request_id', '_head', '_tail', '_tag', '_prefixes')
+
+    def __init__(self, version: int, community: bytes, pdu: PDU):
+        self.request_id: Optional[int] = None
+        self._head = \
+            DerInteger(version).encode() + DerOctetString(community).encode()
+        self._tail = _strip_header(DerSequence(pdu.encode_fields()).encode())
+        self._tag = 0xA0 | (pdu.pdu_id or 0)
+        self._prefixes: dict[int, bytes] = {}
+
+    def _make_prefix(self, width: int) -> bytes:
+        pdu_size = 2 + width + len(self._tail)
+        pdu_header = bytes((self._tag, )) + encode_length(pdu_size)
+        msg_size = len(self._head) + len(pdu_header) + pdu_size
+        prefix = self._prefixes[width] = b''.join((
+            b'\x30',
+            encode_length(msg_size),
+            self._head,
+            pdu_header,
+            bytes((0x02, width)),
+        ))
+        return prefix
+
+    def encode(self) -> bytes:
+        request_id = self.request_id
+        assert request_id is not None and request_id >= 0
+        # one extra bit for the sign as the request-id is a signed INTEGER
+        width = (request_id.bit_length() + 8) // 8
+        prefix = self._prefixes.get(width) or self._make_prefix(width)
+        return prefix + request_id.to_bytes(width, 'big') + self._tail
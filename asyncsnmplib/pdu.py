@@ -1,7 +1,15 @@
-from typing import Iterable
-from Crypto.Util.asn1 import (
-    DerSequence, DerOctetString, DerObjectId, DerObject, DerNull)
+from typing import Any, Iterable
+from Crypto.Util.asn1 import DerSequence, DerOctetString, DerObject, DerNull
 from .asn1 import TOid
+from .oid import oid_to_ber
+
+_NULL = DerNull().encode()
+
+
+def _encode_variable_bindings(oids: Iterable[TOid]) -> DerSequence:
+    return DerSequence([
+        DerSequence([oid_to_ber(oid), _NULL]) for oid in oids
+    ])
 
 
 class PDU(DerObject):
@@ -18,16 +26,18 @@ class PDU(DerObject):
         self.error_index = error_index
         self.variable_bindings = variable_bindings
 
-    def encode(self):
-        s = DerSequence([
-            self.request_id,
+    def encode_fields(self) -> list[Any]:
+        """returns the fields which follow the request_id"""
+        return [
             self.error_status,
             self.error_index,
-            DerSequence([
-                DerSequence([DerObjectId('.'.join(map(str, oid))), DerNull()])
-                for oid in self.variable_bindings
-            ]),
-        ], implicit=self.pdu_id)
+            _encode_variable_bindings(self.variable_bindings),
+        ]
+
+    def encode(self):
+        s = DerSequence(
+            [self.request_id, *self.encode_fields()],
+            implicit=self.pdu_id)
         return s.encode()
 
 
@@ -77,14 +87,9 @@ class SnmpGetBulk(PDU):
         self.max_repetitions = max_repetitions
         self.variable_bindings = variable_bindings
 
-    def encode(self):
-        s = DerSequence([
-            self.request_id,
+    def encode_fields(self) -> list[Any]:
+        return [
             self.non_repeaters,
             self.max_repetitions,
-            DerSequence([
-                DerSequence([DerObjectId('.'.join(map(str, oid))), DerNull()])
-                for oid in self.variable_bindings
-            ]),
-        ], implicit=self.pdu_id)
-        return s.encode()
+            _encode_variable_bindings(self.variable_bindings),
+        ]
@@ -3,8 +3,9 @@ import logging
 from typing import Any, Union
 from . import exceptions
 from .asn1 import Tag, TOid, TValue
+from .oid import oid_to_str
 from .package import Package
-from .package import SnmpMessage
+from .package import SnmpMessage, SnmpPreparedMessage
 
 
 _ERROR_STATUS_TO_EXCEPTION = {
@@ -80,7 +81,7 @@ class SnmpProtocol(asyncio.DatagramProtocol):
                     if pkg.error_index:  # also exclude None for trap-pdu
                         oidtuple = \
                             pkg.variable_bindings[pkg.error_index - 1][0]
-                        oid = '.'.join(map(str, oidtuple))
+                        oid = oid_to_str(oidtuple)
                     exception = _ERROR_STATUS_TO_EXCEPTION[pkg.error_status](
                         oid
                     )
@@ -99,7 +100,8 @@ class SnmpProtocol(asyncio.DatagramProtocol):
         addr = self.target[0]
         return f'{msg} (source ip: {addr})'
 
-    async def _send(self, pkg: SnmpMessage, timeout: float = 10.0):
+    async def _send(self, pkg: Union[SnmpMessage, SnmpPreparedMessage],
+                    timeout: float = 10.0):
         self._request_id += 1
         self._request_id %= 0x10000
 
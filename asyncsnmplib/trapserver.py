@@ -64,12 +64,15 @@ class SnmpTrapProtocol(SnmpProtocol):
         else:
             logging.debug('Trap message received')
             for oid, _tag, value in pkg.variable_bindings:
-                mib_object = MIB_INDEX.get(oid[:-1])
-                if mib_object is None:
+                found = MIB_INDEX.find(oid)
+                if found is None or found[0].tp != 'OBJECT-TYPE':
                     # only accept oids from loaded mibs
                     continue
+                mib_object, idx = found
+                index = '.'.join(map(str, idx))
                 logging.info(
-                    f'oid: {oid} name: {mib_object["name"]} value: {value}'
+                    f'oid: {oid} name: {mib_object.name} '
+                    f'index: {index} value: {value}'
                 )
                 # TODO some values need oid lookup for the value, do here or in
                 # outside processor
@@ -107,10 +107,37 @@ def authenticate_sha512(auth_key: bytes, msg: bytes):
     return d[:48]
 
 
+def prepare_hmac(auth_key: bytes, hash_func: Any) -> hmac.HMAC:
+    """returns a HMAC object keyed with the localized key; the ipad/opad
+    key blocks are derived once and each message uses a copy"""
+    return hmac.new(auth_key, digestmod=hash_func)
+
+
+def authenticate_prepared(mac: hmac.HMAC, msg: bytes, sz: int) -> bytes:
+    mac = mac.copy()
+    mac.update(msg)
+    return mac.digest()[:sz]
+
+
+def verify_prepared(mac: hmac.HMAC, msg: bytes, offset: int, digest: bytes,
+                    sz: int) -> bool:
+    """verifies the digest which is found at offset in msg; the digest is
+    replaced by zeros without copying msg"""
+    if len(digest) != sz:
+        return False
+    view = memoryview(msg)
+    mac = mac.copy()
+    mac.update(view[:offset])
+    mac.update(bytes(sz))
+    mac.update(view[offset + sz:])
+    return hmac.compare_digest(mac.digest()[:sz], digest)
+
+
 class Auth:
     hash_passphrase: Callable[[str], bytes]
     localize: Callable[[bytes, bytes], bytes]
     auth: Callable[[bytes, bytes], bytes]
+    hash_func: Any
     sz: int
 
 
@@ -118,6 +145,7 @@ class USM_AUTH_HMAC96_MD5(Auth):
     hash_passphrase = hash_passphrase_md5
     localize = localize_key_md5
     auth = authenticate_md5
+    hash_func = md5
     sz = 12
 
 
@@ -125,6 +153,7 @@ class USM_AUTH_HMAC96_SHA(Auth):
     hash_passphrase = hash_passphrase_sha
     localize = localize_key_sha
     auth = authenticate_sha
+    hash_func = sha1
     sz = 12
 
 
@@ -132,6 +161,7 @@ class USM_AUTH_HMAC128_SHA224(Auth):
     hash_passphrase = hash_passphrase_sha224
     localize = localize_key_sha224
     auth = authenticate_sha224
+    hash_func = sha224
     sz = 16
 
 
@@ -139,6 +169,7 @@ class USM_AUTH_HMAC192_SHA256(Auth):
     hash_passphrase = hash_passphrase_sha256
     localize = localize_key_sha256
     auth = authenticate_sha256
+    hash_func = sha256
     sz = 24
 
 
@@ -146,6 +177,7 @@ class USM_AUTH_HMAC256_SHA384(Auth):
     hash_passphrase = hash_passphrase_sha384
     localize = localize_key_sha384
     auth = authenticate_sha384
+    hash_func = sha384
     sz = 32
 
 
@@ -153,6 +185,7 @@ class USM_AUTH_HMAC384_SHA512(Auth):
     hash_passphrase = hash_passphrase_sha512
     localize = localize_key_sha512
     auth = authenticate_sha512
+    hash_func = sha512
     sz = 48
 
 
@@ -1,14 +1,20 @@
 import asyncio
+import hmac
 import logging
 import time
 from typing import Type, Callable, Awaitable, Optional
-from .auth import Auth
+from .auth import Auth, prepare_hmac
 from .encr import Priv
+from .keycache import derive_key, derive_key_async, localized_key
 from .usm import UsmSecurityParameters
 
+# confirmed params are discovered again on an (unauthenticated) unknown
+# engine id report at most once in this interval (in seconds)
+REDISCOVERY_INTERVAL = 60.0
+
 
 class SnmpV3Cache:
-    _lock: asyncio.Lock
+    _discovery: Optional[asyncio.Future[UsmSecurityParameters]]
     _params: Optional[tuple[UsmSecurityParameters, float]]
 
     def __init__(
@@ -16,55 +22,169 @@ class SnmpV3Cache:
         username: str,
         auth: Optional[tuple[Type[Auth], str]] = None,
         priv: Optional[tuple[Type[Priv], str]] = None,
+        offload: bool = False,
     ):
-        self._lock = asyncio.Lock()
+        """When offload is True, the keys are derived from the passphrases in
+        a thread on the first call to get_params"""
+        self._discovery = None
         self._params = None
+        # params which are not yet confirmed by a response, see warm()
+        self._confirmed = False
+        # time.monotonic() of the last discovery
+        self._discovered: Optional[float] = None
+        self._warm: Optional[tuple[bytes, int, float]] = None
+        self._passphrases: Optional[tuple[str, Optional[str]]] = None
 
         self._username = username.encode()
         self._auth_proto: Optional[Type[Auth]] = None
         self._auth_hash: Optional[bytes] = None
         self._auth_hash_localized: Optional[bytes] = None
+        self._auth_hmac: Optional[hmac.HMAC] = None
         self._priv_proto: Optional[Type[Priv]] = None
         self._priv_hash: Optional[bytes] = None
         self._priv_hash_localized: Optional[bytes] = None
         if auth is not None:
             self._auth_proto, auth_passwd = auth
-            self._auth_hash = self._auth_proto.hash_passphrase(auth_passwd)
+            priv_passwd = None
             if priv is not None:
                 self._priv_proto, priv_passwd = priv
-                self._priv_hash = self._auth_proto.hash_passphrase(priv_passwd)
+            if offload:
+                self._passphrases = (auth_passwd, priv_passwd)
+            else:
+                self._auth_hash = derive_key(self._auth_proto, auth_passwd)
+                if priv_passwd is not None:
+                    self._priv_hash = derive_key(
+                        self._auth_proto, priv_passwd)
+
+    async def _derive_keys(self):
+        assert self._auth_proto is not None and self._passphrases is not None
+        auth_passwd, priv_passwd = self._passphrases
+        self._auth_hash = await derive_key_async(
+            self._auth_proto, auth_passwd)
+        if priv_passwd is not None:
+            self._priv_hash = await derive_key_async(
+                self._auth_proto, priv_passwd)
+        self._passphrases = None
+
+    def _current_params(self) -> UsmSecurityParameters:
+        assert self._params is not None
+        usm_params, last_boot_time = self._params
+        return UsmSecurityParameters(
+            usm_params.authoritative_engine_id,
+            usm_params.authoritative_engine_boots,
+            int(time.time() - last_boot_time),
+            usm_params.username,
+            usm_params.authentication_parameters,
+            usm_params.privacy_parameters,
+        )
 
     async def get_params(self,
                          load: Callable[[], Awaitable[UsmSecurityParameters]]
                          ) -> tuple[UsmSecurityParameters, bool]:
-        async with self._lock:
-            if self._params is None:
+        while True:
+            if self._params is not None:
+                # cached params, no need to synchronize
+                return self._current_params(), False
+
+            fut = self._discovery
+            if fut is None:
+                break
+
+            # wait for the discovery started by another request
+            try:
+                return await asyncio.shield(fut), False
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                # the discovering request was cancelled, try again
+
+        loop = asyncio.get_running_loop()
+        fut = self._discovery = loop.create_future()
+        try:
+            if self._passphrases is not None:
+                await self._derive_keys()
+            if self._warm is not None:
+                engine_id, boots, boot_epoch = self._warm
+                self._warm = None
+                params = UsmSecurityParameters(
+                    engine_id, boots, int(time.time() - boot_epoch),
+                    b'', b'', b'')
+                self.set_params(params)
+                self._confirmed = False
+                is_new = False
+            else:
                 logging.info('Retrieve new authentication params')
+                self._discovered = time.monotonic()
                 params = await load()
                 self.set_params(params)
-                return params, True
-            usm_params, last_boot_time = self._params
-            return UsmSecurityParameters(
-                usm_params.authoritative_engine_id,
-                usm_params.authoritative_engine_boots,
-                int(time.time() - last_boot_time),
-                usm_params.username,
-                usm_params.authentication_parameters,
-                usm_params.privacy_parameters,
-            ), False
+                is_new = True
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # retrieved, there might be no other waiters
+            raise
+        finally:
+            self._discovery = None
+        fut.set_result(params)
+        return params, is_new
 
     def set_params(self, usm_params: UsmSecurityParameters):
         if self._auth_proto:
-            self._auth_hash_localized = self._auth_proto.localize(
+            self._auth_hash_localized = localized_key(
+                self._auth_proto,
                 self._auth_hash,  # type: ignore
                 usm_params.authoritative_engine_id)
+            self._auth_hmac = prepare_hmac(
+                self._auth_hash_localized, self._auth_proto.hash_func)
             if self._priv_proto:
-                self._priv_hash_localized = self._auth_proto.localize(
+                self._priv_hash_localized = self._priv_proto.localize(
+                    self._auth_proto,
                     self._priv_hash,   # type: ignore
                     usm_params.authoritative_engine_id)
 
         last_boot_time = time.time() - usm_params.authoritative_engine_time
         self._params = (usm_params, last_boot_time)
+        self._confirmed = True
+
+    def warm(self, engine_id: bytes, boots: int, boot_epoch: float):
+        """use previously discovered engine params (see SnmpV3EngineStore)
+        instead of a discovery; they are used on the next get_params"""
+        if self._params is None:
+            self._warm = (engine_id, boots, boot_epoch)
+
+    def engine_state(self) -> Optional[tuple[bytes, int, float]]:
+        if self._params is None:
+            return None
+        usm_params, last_boot_time = self._params
+        return (usm_params.authoritative_engine_id,
+                usm_params.authoritative_engine_boots,
+                last_boot_time)
+
+    def resync(self, usm_params: UsmSecurityParameters) -> bool:
+        """updates engine boots and time from a report; returns False when
+        the report is for another engine"""
+        if self._params is None:
+            return False
+        cached, _ = self._params
+        if usm_params.authoritative_engine_id != \
+                cached.authoritative_engine_id:
+            return False
+        last_boot_time = time.time() - usm_params.authoritative_engine_time
+        self._params = (cached._replace(
+            authoritative_engine_boots=usm_params.authoritative_engine_boots,
+        ), last_boot_time)
+        self._confirmed = True
+        return True
+
+    def may_rediscover(self) -> bool:
+        """returns True when an unknown engine id report may start a new
+        discovery; reports are not authenticated, so for confirmed params
+        this is limited to once in REDISCOVERY_INTERVAL"""
+        return not self._confirmed or self._discovered is None or \
+            time.monotonic() - self._discovered >= REDISCOVERY_INTERVAL
 
     def clear(self):
         self._params = None
+        self._warm = None
@@ -1,30 +1,40 @@
 import struct
+from functools import lru_cache
 from ..exceptions import SnmpDecryptionError
 from Crypto.Cipher import DES, AES
 from Crypto.Random import get_random_bytes
 from Crypto.Util.Padding import pad
 from typing import Callable, Type, Any
+from .auth import Auth, hash_passphrase, localize_key
+from .keycache import LOCALIZED_KEY_CACHE_SIZE, localized_key
 
+# the key schedule is computed once per localized key; the ECB objects are
+# stateless and shared by all messages
+CIPHER_CACHE_SIZE = 1024
 
-def encrypt_data(key: bytes, data: bytes, msgsecurityparams: list[Any]):
-    # engine_boots = msgsecurityparams[1]
-    # rand_ = random.randrange(0, 0xFFFFFFFF)
-
-    # salt = struct.pack(
-    #     'B' * 8,
-    #     engine_boots >> 24 & 0xFF,
-    #     engine_boots >> 16 & 0xFF,
-    #     engine_boots >> 8 & 0xFF,
-    #     engine_boots & 0xFF,
-    #     rand_ >> 24 & 0xFF,
-    #     rand_ >> 16 & 0xFF,
-    #     rand_ >> 8 & 0xFF,
-    #     rand_ & 0xFF)
 
+@lru_cache(maxsize=CIPHER_CACHE_SIZE)
+def _des_ecb(key: bytes) -> Any:
+    return DES.new(key, DES.MODE_ECB)  # type: ignore
+
+
+@lru_cache(maxsize=CIPHER_CACHE_SIZE)
+def _aes_ecb(key: bytes) -> Any:
+    return AES.new(key, AES.MODE_ECB)  # type: ignore
+
+
+def _xor(a: bytes, b: bytes) -> bytes:
+    """returns a XOR b; b must be at least as long as a"""
+    n = len(a)
+    return (int.from_bytes(a, 'big') ^
+            int.from_bytes(b[:n], 'big')).to_bytes(n, 'big')
+
+
+def encrypt_data(key: bytes, data: bytes, msgsecurityparams: list[Any]):
     msgsecurityparams[5] = salt = get_random_bytes(8)
 
     des_key = key[:8]
-    iv = struct.pack('B' * 8, *map(lambda x, y: x ^ y, salt, key[8:16]))
+    iv = _xor(salt, key[8:16])
 
     obj = DES.new(des_key, DES.MODE_CBC, iv)  # type: ignore
     return obj.encrypt(pad(data, 8))
@@ -36,49 +46,101 @@ def decrypt_data(key: bytes, data: bytes, msgsecurityparams: list[Any]):
     if len(salt) != 8:
         raise SnmpDecryptionError
 
-    des_key = key[:8]
-    iv = struct.pack('B' * 8, *map(lambda x, y: x ^ y, salt, key[8:16]))
-
     if len(data) % 8 != 0:
         raise SnmpDecryptionError
 
-    obj = DES.new(des_key, DES.MODE_CBC, iv)  # type: ignore
-    return obj.decrypt(data)
+    # CBC: P[i] = D(C[i]) ^ C[i - 1] with C[-1] = IV; all blocks are
+    # decrypted in a single call
+    iv = _xor(salt, key[8:16])
+    return _xor(_des_ecb(key[:8]).decrypt(data), iv + data)
 
 
 def _get_pre_iv(engine_boots: int, engine_time: int):
-    return struct.pack(
-        'B' * 8,
-        engine_boots >> 24 & 0xff,
-        engine_boots >> 16 & 0xff,
-        engine_boots >> 8 & 0xff,
-        engine_boots & 0xff,
-        engine_time >> 24 & 0xff,
-        engine_time >> 16 & 0xff,
-        engine_time >> 8 & 0xff,
-        engine_time & 0xff
-    )
+    return struct.pack('>II', engine_boots & 0xffffffff,
+                       engine_time & 0xffffffff)
 
 
-def encrypt_data_aes(key: bytes, data: bytes, msgsecurityparams: list[Any]):
+def _encrypt_aes(key: bytes, data: bytes, msgsecurityparams: list[Any]):
     msgsecurityparams[5] = salt = get_random_bytes(8)
     pre_iv = _get_pre_iv(msgsecurityparams[1], msgsecurityparams[2])
     iv = pre_iv + salt
-    obj = AES.new(key[:16], AES.MODE_CFB, iv, segment_size=128)  # type: ignore
+    obj = AES.new(key, AES.MODE_CFB, iv, segment_size=128)  # type: ignore
     return obj.encrypt(pad(data, 16))
 
 
+def _decrypt_aes(key: bytes, data: bytes, msgsecurityparams: list[Any]):
+    salt = msgsecurityparams[5]
+
+    if len(salt) != 8:
+        raise SnmpDecryptionError
+
+    # CFB: P[i] = C[i] ^ E(C[i - 1]) with C[-1] = IV; the key stream is
+    # computed in a single call and the ciphertext needs no padding
+    iv = _get_pre_iv(msgsecurityparams[1], msgsecurityparams[2]) + salt
+    size = -(-len(data) // 16) * 16
+    stream = _aes_ecb(key).encrypt((iv + data)[:size])
+    return _xor(data, stream)
+
+
+def encrypt_data_aes(key: bytes, data: bytes, msgsecurityparams: list[Any]):
+    return _encrypt_aes(key[:16], data, msgsecurityparams)
+
+
 def decrypt_data_aes(key: bytes, data: bytes, msgsecurityparams: list[Any]):
-    pre_iv = _get_pre_iv(msgsecurityparams[1], msgsecurityparams[2])
-    iv = pre_iv + msgsecurityparams[5]
-    obj = AES.new(key[:16], AES.MODE_CFB, iv, segment_size=128)  # type: ignore
-    return obj.decrypt(pad(data, 16))
+    return _decrypt_aes(key[:16], data, msgsecurityparams)
+
+
+def encrypt_data_aes192(key: bytes, data: bytes,
+                        msgsecurityparams: list[Any]):
+    return _encrypt_aes(key[:24], data, msgsecurityparams)
+
+
+def decrypt_data_aes192(key: bytes, data: bytes,
+                        msgsecurityparams: list[Any]):
+    return _decrypt_aes(key[:24], data, msgsecurityparams)
+
+
+def encrypt_data_aes256(key: bytes, data: bytes,
+                        msgsecurityparams: list[Any]):
+    return _encrypt_aes(key[:32], data, msgsecurityparams)
+
+
+def decrypt_data_aes256(key: bytes, data: bytes,
+                        msgsecurityparams: list[Any]):
+    return _decrypt_aes(key[:32], data, msgsecurityparams)
+
+
+@lru_cache(maxsize=LOCALIZED_KEY_CACHE_SIZE)
+def extend_key_blumenthal(proto: Type[Auth], key: bytes, engine_id: bytes,
+                          size: int) -> bytes:
+    """returns a localized key of at least size bytes
+    (draft-blumenthal-aes-usm-04: 3.1.2.1)"""
+    localized = localized_key(proto, key, engine_id)
+    while len(localized) < size:
+        localized += proto.hash_func(localized).digest()
+    return localized
+
+
+@lru_cache(maxsize=LOCALIZED_KEY_CACHE_SIZE)
+def extend_key_reeder(proto: Type[Auth], key: bytes, engine_id: bytes,
+                      size: int) -> bytes:
+    """returns a localized key of at least size bytes
+    (draft-reeder-snmpv3-usm-3desede-00: 2.1)"""
+    localized = localized_key(proto, key, engine_id)
+    while len(localized) < size:
+        ku = hash_passphrase(localized, proto.hash_func)
+        localized += localize_key(ku, engine_id, proto.hash_func)
+    return localized
 
 
 class Priv:
     encrypt: Callable[[bytes, bytes, Any], bytes]
     decrypt: Callable[[bytes, Any, Any], bytes]
 
+    @staticmethod
+    def localize(proto: Type[Auth], key: bytes, engine_id: bytes) -> bytes:
+        return localized_key(proto, key, engine_id)
+
 
 class USM_PRIV_CBC56_DES(Priv):
     encrypt = encrypt_data
@@ -90,7 +152,48 @@ class USM_PRIV_CFB128_AES(Priv):
     decrypt = decrypt_data_aes
 
 
+class USM_PRIV_CFB192_AES(Priv):
+    encrypt = encrypt_data_aes192
+    decrypt = decrypt_data_aes192
+
+    @staticmethod
+    def localize(proto: Type[Auth], key: bytes, engine_id: bytes) -> bytes:
+        return extend_key_blumenthal(proto, key, engine_id, 24)
+
+
+class USM_PRIV_CFB256_AES(Priv):
+    encrypt = encrypt_data_aes256
+    decrypt = decrypt_data_aes256
+
+    @staticmethod
+    def localize(proto: Type[Auth], key: bytes, engine_id: bytes) -> bytes:
+        return extend_key_blumenthal(proto, key, engine_id, 32)
+
+
+# key extension as used by Cisco and net-snmp (--with-reeder)
+class USM_PRIV_CFB192_AES_C(Priv):
+    encrypt = encrypt_data_aes192
+    decrypt = decrypt_data_aes192
+
+    @staticmethod
+    def localize(proto: Type[Auth], key: bytes, engine_id: bytes) -> bytes:
+        return extend_key_reeder(proto, key, engine_id, 24)
+
+
+class USM_PRIV_CFB256_AES_C(Priv):
+    encrypt = encrypt_data_aes256
+    decrypt = decrypt_data_aes256
+
+    @staticmethod
+    def localize(proto: Type[Auth], key: bytes, engine_id: bytes) -> bytes:
+        return extend_key_reeder(proto, key, engine_id, 32)
+
+
 PRIV_PROTO: dict[str, Type[Priv]] = {
     'USM_PRIV_CBC56_DES': USM_PRIV_CBC56_DES,
     'USM_PRIV_CFB128_AES': USM_PRIV_CFB128_AES,
+    'USM_PRIV_CFB192_AES': USM_PRIV_CFB192_AES,
+    'USM_PRIV_CFB256_AES': USM_PRIV_CFB256_AES,
+    'USM_PRIV_CFB192_AES_C': USM_PRIV_CFB192_AES_C,
+    'USM_PRIV_CFB256_AES_C': USM_PRIV_CFB256_AES_C,
 }
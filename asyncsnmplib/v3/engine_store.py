@@ -0,0 +1,53 @@
+import json
+import logging
+import os
+from typing import Optional
+
+
+class SnmpV3EngineStore:
+    """Engine discovery state of SNMPv3 targets, kept on disk.
+
+    For each target (`host:port`) the engine id, engine boots and the
+    estimated boot epoch (time.time() - engine time) are stored. SnmpV3
+    clients which are created with a store use an entry instead of a
+    discovery round trip; a stale entry is replaced through the normal
+    report handling. The store is written to disk with `save()`.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._engines: dict[str, tuple[bytes, int, float]] = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.warning(f'Failed to read engine store {self.path}: {e}')
+            return
+        for target, (engine_id, boots, boot_epoch) in data.items():
+            self._engines[target] = (bytes.fromhex(engine_id), boots,
+                                     boot_epoch)
+
+    def save(self):
+        data = {
+            target: [engine_id.hex(), boots, boot_epoch]
+            for target, (engine_id, boots, boot_epoch)
+            in self._engines.items()
+        }
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def get(self, target: str) -> Optional[tuple[bytes, int, float]]:
+        return self._engines.get(target)
+
+    def set(self, target: str, engine_id: bytes, boots: int,
+            boot_epoch: float):
+        self._engines[target] = (engine_id, boots, boot_epoch)
+
+    def remove(self, target: str):
+        self._engines.pop(target, None)
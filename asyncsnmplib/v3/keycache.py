@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import Optional, Type
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+from .auth import Auth
+
+# (hash algorithm, sha256 of the passphrase) -> key (RFC3414: A.2)
+_KEYS: dict[tuple[str, bytes], bytes] = {}
+_PENDING: dict[tuple[str, bytes], asyncio.Task[bytes]] = {}
+
+_cache_file: Optional[str] = None
+_cache_secret: Optional[bytes] = None
+_store_dirty = False
+_store_task: Optional[asyncio.Future[None]] = None
+
+# many devices share credentials and cloned devices share engine ids, the
+# localized keys are shared by all clients
+LOCALIZED_KEY_CACHE_SIZE = 4096
+
+
+def _key(proto: Type[Auth], passphrase: str) -> tuple[str, bytes]:
+    name: str = proto.hash_func().name
+    return name, hashlib.sha256(passphrase.encode()).digest()
+
+
+def _encrypt(secret: bytes, data: bytes) -> bytes:
+    nonce = get_random_bytes(16)
+    cipher = AES.new(secret, AES.MODE_GCM, nonce=nonce)
+    ciphertext, tag = cipher.encrypt_and_digest(data)
+    return nonce + tag + ciphertext
+
+
+def _decrypt(secret: bytes, data: bytes) -> bytes:
+    nonce, tag, ciphertext = data[:16], data[16:32], data[32:]
+    cipher = AES.new(secret, AES.MODE_GCM, nonce=nonce)
+    return cipher.decrypt_and_verify(ciphertext, tag)
+
+
+def _write(path: str, secret: bytes, keys: dict[tuple[str, bytes], bytes]):
+    data = json.dumps({
+        f'{name}:{digest.hex()}': key.hex()
+        for (name, digest), key in keys.items()
+    }).encode()
+    tmp = f'{path}.tmp'
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_encrypt(secret, data))
+        os.replace(tmp, path)
+    except Exception as e:
+        logging.error(f'Failed to write key cache {path}: {e}')
+
+
+def flush():
+    """writes new keys to the cache file; keys derived by derive_key
+    outside of an event loop are only written by this function"""
+    global _store_dirty
+    if not _store_dirty:
+        return
+    _store_dirty = False
+    if _cache_file is None or _cache_secret is None:
+        return
+    _write(_cache_file, _cache_secret, dict(_KEYS))
+
+
+async def _store_async(executor: Optional[Executor]):
+    """writes the cache in the executor; keys which are derived while a
+    write is running are written together by the next write"""
+    global _store_dirty, _store_task
+    loop = asyncio.get_running_loop()
+    try:
+        while _store_dirty:
+            _store_dirty = False
+            if _cache_file is None or _cache_secret is None:
+                break
+            await loop.run_in_executor(
+                executor, _write, _cache_file, _cache_secret, dict(_KEYS))
+    finally:
+        _store_task = None
+
+
+def _schedule_store(executor: Optional[Executor]):
+    global _store_dirty, _store_task
+    if _cache_file is None:
+        return
+    _store_dirty = True
+    if _store_task is None:
+        _store_task = asyncio.ensure_future(_store_async(executor))
+
+
+def set_cache_file(path: Optional[str], secret: bytes = b''):
+    """Enable the encrypted on-disk key cache.
+
+    Keys in `path` are loaded and newly derived keys are written back to
+    it, in an executor when derived on an event loop and by `flush()`
+    otherwise. The file is encrypted with AES-GCM using a key derived from
+    `secret`. Use `None` as path to disable the on-disk cache.
+    """
+    global _cache_file, _cache_secret
+    if path is None:
+        _cache_file = _cache_secret = None
+        return
+    if not secret:
+        raise ValueError('A secret is required for the key cache')
+
+    _cache_file = path
+    _cache_secret = hashlib.sha256(secret).digest()
+    try:
+        with open(path, 'rb') as f:
+            data = _decrypt(_cache_secret, f.read())
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logging.warning(f'Failed to read key cache {path}: {e}')
+        return
+
+    for k, key in json.loads(data).items():
+        name, digest = k.split(':')
+        _KEYS[(name, bytes.fromhex(digest))] = bytes.fromhex(key)
+
+
+def derive_key(proto: Type[Auth], passphrase: str) -> bytes:
+    """returns the (not localized) key for a passphrase; on an event loop
+    new keys are written to the cache file once in the default executor,
+    otherwise by flush(); use derive_key_async to hash in an executor"""
+    global _store_dirty
+    k = _key(proto, passphrase)
+    key = _KEYS.get(k)
+    if key is None:
+        key = _KEYS[k] = proto.hash_passphrase(passphrase)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            _store_dirty = _cache_file is not None
+        else:
+            _schedule_store(None)
+    return key
+
+
+async def _derive(k: tuple[str, bytes], proto: Type[Auth], passphrase: str,
+                  executor: Optional[Executor]) -> bytes:
+    loop = asyncio.get_running_loop()
+    try:
+        key = await loop.run_in_executor(
+            executor, proto.hash_passphrase, passphrase)
+    finally:
+        del _PENDING[k]
+    _KEYS[k] = key
+    _schedule_store(executor)
+    return key
+
+
+def _retrieve(task: asyncio.Task[bytes]):
+    # all waiters might be cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+async def derive_key_async(proto: Type[Auth], passphrase: str,
+                           executor: Optional[Executor] = None) -> bytes:
+    """same as derive_key but hashing and writing the cache file run in an
+    executor; concurrent calls for the same passphrase wait for a single
+    derivation which is not cancelled when one of the callers is"""
+    k = _key(proto, passphrase)
+    key = _KEYS.get(k)
+    if key is not None:
+        return key
+
+    task = _PENDING.get(k)
+    if task is None:
+        task = _PENDING[k] = asyncio.ensure_future(
+            _derive(k, proto, passphrase, executor))
+        task.add_done_callback(_retrieve)
+    return await asyncio.shield(task)
+
+
+@lru_cache(maxsize=LOCALIZED_KEY_CACHE_SIZE)
+def localized_key(proto: Type[Auth], key: bytes, engine_id: bytes) -> bytes:
+    """returns the key localized for an engine id (RFC3414: A.2)"""
+    return proto.localize(key, engine_id)
+
+
+def clear():
+    _KEYS.clear()
+    localized_key.cache_clear()
@@ -1,7 +1,9 @@
+import hmac
 from typing import Any, Type
-from Crypto.Util.asn1 import DerSequence, DerOctetString, DerObject
-from ..asn1 import Decoder, Tag, TOid, TValue
-from .auth import Auth
+from Crypto.Util.asn1 import (
+    DerSequence, DerOctetString, DerObject, DerInteger)
+from ..asn1 import Decoder, Tag, TOid, TValue, encode_length
+from .auth import Auth, authenticate_prepared, verify_prepared
 from .encr import Priv
 from .usm import UsmSecurityParameters
 
@@ -38,6 +40,18 @@ def _decode_scopedpdu(decoder: Decoder) -> list[Any]:
     ]
 
 
+def decrypt_scopedpdu(proto: Type[Priv], key: bytes, data: Any,
+                      msgsecurityparameters: Any) -> list[Any]:
+    """returns the decrypted and decoded scopedPDU; this is a module level
+    function so it can run in a process pool"""
+    try:
+        pdu = proto.decrypt(key, data, msgsecurityparameters)
+    except Exception as e:
+        raise Exception(f'failed to decrypt pdu: {e}')
+    decoder = Decoder(pdu)
+    return _decode_scopedpdu(decoder)
+
+
 def _encode_msgsecurityparameters(orig: UsmSecurityParameters):
     encoder = DerSequence([
         DerOctetString(orig[0]),
@@ -50,7 +64,10 @@ def _encode_msgsecurityparameters(orig: UsmSecurityParameters):
     return encoder.encode()
 
 
-def _decode_msgsecurityparameters(data: bytes):
+def _decode_msgsecurityparameters(data: bytes
+                                  ) -> tuple[UsmSecurityParameters, int]:
+    """returns the params and the offset of the contents of
+    msgAuthenticationParameters within data"""
     decoder = Decoder(data)
     with decoder.enter():
         _, authoritative_engine_id = decoder.read()
@@ -58,6 +75,7 @@ def _decode_msgsecurityparameters(data: bytes):
         _, authoritative_engine_time = decoder.read()
         _, username = decoder.read()
         _, authentication_parameters = decoder.read()
+        auth_offset = decoder.offset() - len(authentication_parameters)
         _, privacy_parameters = decoder.read()
     return UsmSecurityParameters(
         authoritative_engine_id,
@@ -66,7 +84,7 @@ def _decode_msgsecurityparameters(data: bytes):
         username,
         authentication_parameters,
         privacy_parameters
-    )
+    ), auth_offset
 
 
 class Package:
@@ -79,21 +97,33 @@ class Package:
     msgsecurityparameters: Any  # UsmSecurityParameters | list
     msgdata: list[Any]
     pdu: DerObject
+    auth_offset: int  # offset of msgAuthenticationParameters (decoded)
 
-    def encode(self):
+    def _encode(self) -> tuple[bytes, int]:
+        """returns the encoded message and the offset of the contents of
+        msgAuthenticationParameters within the message"""
         params = _encode_msgsecurityparameters(self.msgsecurityparameters)
-        encoder = DerSequence([
-            self.version,
-            DerSequence([
-                self.request_id,
-                self.msgmaxsize,
-                DerOctetString(self.msgflags),
-                self.msgsecuritymodel,
-            ]),
-            DerOctetString(params),
-            self.pdu
-        ])
-        return encoder.encode()
+        # msgAuthenticationParameters is followed by msgPrivacyParameters
+        auth_offset = len(params) \
+            - len(DerOctetString(self.msgsecurityparameters[5]).encode()) \
+            - len(self.msgsecurityparameters[4])
+
+        head = DerInteger(self.version).encode() + DerSequence([
+            self.request_id,
+            self.msgmaxsize,
+            DerOctetString(self.msgflags),
+            self.msgsecuritymodel,
+        ]).encode()
+        octets = DerOctetString(params).encode()
+        auth_offset += len(head) + len(octets) - len(params)
+
+        body = head + octets + self.pdu.encode()
+        header = b'\x30' + encode_length(len(body))
+        return header + body, len(header) + auth_offset
+
+    def encode(self):
+        encoded, _ = self._encode()
+        return encoded
 
     def decode(self, data: bytes):
         decoder = Decoder(data)
@@ -107,7 +137,9 @@ class Package:
                 _, msgsecuritymodel = decoder.read()
 
             _, msgsecurityparameters = decoder.read()
-            params = _decode_msgsecurityparameters(msgsecurityparameters)
+            params, auth_offset = _decode_msgsecurityparameters(
+                msgsecurityparameters)
+            auth_offset += decoder.offset() - len(msgsecurityparameters)
 
             if msgflags == b'\x03':
                 _, msgdata = decoder.read()
@@ -121,6 +153,7 @@ class Package:
         self.msgsecuritymodel = msgsecuritymodel
         self.msgsecurityparameters = params
         self.msgdata = msgdata
+        self.auth_offset = auth_offset
 
     def encrypt(self, proto: Type[Priv], key: bytes):
         encoded = self.pdu.encode()
@@ -131,24 +164,25 @@ class Package:
         self.pdu = DerOctetString(encryped)
 
     def decrypt(self, proto: Type[Priv], key: bytes):
-        try:
-            pdu = proto.decrypt(key, self.msgdata, self.msgsecurityparameters)
-        except Exception as e:
-            raise Exception(f'failed to decrypt pdu: {e}')
-        decoder = Decoder(pdu)
-        self.msgdata = _decode_scopedpdu(decoder)
+        self.msgdata = decrypt_scopedpdu(
+            proto, key, self.msgdata, self.msgsecurityparameters)
 
-    def encode_auth(self, proto: Type[Auth], key: bytes):
+    def encode_auth(self, proto: Type[Auth], mac: hmac.HMAC):
         self.msgsecurityparameters[4] = b'\x00' * proto.sz
-        encoded = self.encode()
-        auth_key = proto.auth(key, encoded)
-
-        # set auth_key
-        self.msgsecurityparameters[4] = auth_key[:proto.sz]
-
-        # encode again with the auth_key
-        encoded = self.encode()
-        return encoded
+        encoded, offset = self._encode()
+        auth_key = authenticate_prepared(mac, encoded, proto.sz)
+
+        # set auth_key, the message is not encoded again as the size of
+        # the auth_key is equal to the zero placeholder
+        self.msgsecurityparameters[4] = auth_key
+        msg = bytearray(encoded)
+        msg[offset:offset + proto.sz] = auth_key
+        return bytes(msg)
+
+    def verify_auth(self, proto: Type[Auth], mac: hmac.HMAC, data: bytes):
+        """returns True when the decoded data is authenticated with mac"""
+        return verify_prepared(mac, data, self.auth_offset,
+                               self.msgsecurityparameters[4], proto.sz)
 
 
 class SnmpV3Message(Package):
@@ -1,12 +1,21 @@
 import asyncio
+import hmac
 import logging
-from typing import Any, Optional, Type
+from concurrent.futures import Executor
+from typing import Any, Optional, Type, Union
 from ..asn1 import Tag, TOid, TValue
-from ..exceptions import SnmpTimeoutError, SnmpAuthV3Exception
-from ..protocol import SnmpProtocol, _ERROR_STATUS_TO_EXCEPTION
+from ..exceptions import (
+    SnmpTimeoutError,
+    SnmpAuthV3Exception,
+    SnmpNotInTimeWindow,
+    SnmpUnknownEngineId,
+)
+from ..oid import oid_to_str
+from ..protocol import DEFAULT_TIMEOUTS, SnmpProtocol
+from ..protocol import _ERROR_STATUS_TO_EXCEPTION
 from .auth import Auth
 from .encr import Priv
-from .package import Package, SnmpV3Message
+from .package import Package, SnmpV3Message, decrypt_scopedpdu
 
 _RESPONSE_PDU_ID = 2
 _REPORT_PDU_ID = 8
@@ -18,10 +27,54 @@ _REPORT_OID_EXCEPTIONS = {
     (1, 3, 6, 1, 6, 3, 15, 1, 1, 5, 0): 'Wrong digest value',
     (1, 3, 6, 1, 6, 3, 15, 1, 1, 6, 0): 'Decryption error',
 }
+_REPORT_OID_EXCEPTION_CLASSES = {
+    (1, 3, 6, 1, 6, 3, 15, 1, 1, 2, 0): SnmpNotInTimeWindow,
+    (1, 3, 6, 1, 6, 3, 15, 1, 1, 4, 0): SnmpUnknownEngineId,
+}
+_UNKNOWN_ENGINE_ID_OID = (1, 3, 6, 1, 6, 3, 15, 1, 1, 4, 0)
+
+# encrypted responses of at least this size (in bytes) are decrypted and
+# decoded in the executor, when one is given
+OFFLOAD_THRESHOLD = 4096
+
+
+def _is_authenticated(pkg: Package) -> bool:
+    # msgFlags is a single octet, an empty value has no flags set
+    return bool(pkg.msgflags) and bool(pkg.msgflags[0] & 1)
+
+
+def _is_unknown_engine_id_report(pkg: Package) -> bool:
+    """returns True for an unknownEngineID report; this report is sent
+    without authentication as the agent cannot verify the request
+    (RFC3414: 3.2 step 3), a notInTimeWindow report is authenticated"""
+    try:
+        _, _, pdu = pkg.msgdata
+        pdu_id, _, _, _, vbs = pdu
+        return pdu_id == _REPORT_PDU_ID and \
+            vbs[0][0] == _UNKNOWN_ENGINE_ID_OID
+    except Exception:
+        # an encrypted or malformed scoped PDU
+        return False
 
 
 class SnmpV3Protocol(SnmpProtocol):
-    __slots__ = ('_params', )
+    __slots__ = ('_params', '_auth', '_executor', '_offload_threshold')
+
+    def __init__(self,
+                 target: Union[tuple[str, int], tuple[str, int, int, int]],
+                 timeouts: tuple[int, ...] = DEFAULT_TIMEOUTS,
+                 executor: Optional[Executor] = None,
+                 offload_threshold: int = OFFLOAD_THRESHOLD):
+        """The executor can be a ThreadPoolExecutor or a
+        ProcessPoolExecutor; without an executor all responses are handled
+        on the event loop"""
+        super().__init__(target, timeouts)
+        self._params = None
+        # request id -> auth of the request, used to verify the response,
+        # and whether an unauthenticated unknownEngineID report is accepted
+        self._auth: dict[int, tuple[Type[Auth], hmac.HMAC, bool]] = {}
+        self._executor = executor
+        self._offload_threshold = offload_threshold
 
     def datagram_received(self, data: bytes, addr: Any):
         # NOTE on typing
@@ -39,6 +92,29 @@ class SnmpV3Protocol(SnmpProtocol):
                 logging.error(
                     self._log_with_suffix(f'Unknown package pid {pid}'))
             else:
+                auth = self._auth.get(pid)
+                if auth is not None and _is_authenticated(pkg):
+                    auth_proto, auth_hmac, _ = auth
+                    if not pkg.verify_auth(auth_proto, auth_hmac, data):
+                        # spoofed or corrupted, the request will time out
+                        # when no valid response is received
+                        logging.error(self._log_with_suffix(
+                            f'Authentication failed for package pid {pid}'))
+                        return
+                elif auth is not None:
+                    _, _, accept_report = auth
+                    if not accept_report or \
+                            not _is_unknown_engine_id_report(pkg):
+                        # spoofed or stale, the request stays pending for
+                        # the authenticated response
+                        logging.error(self._log_with_suffix(
+                            f'Unauthenticated package pid {pid} ignored'))
+                        return
+                    # an unknown engine id report is only a hint for the
+                    # request to run a new discovery, the params of the
+                    # report are not trusted
+                    self.requests[pid].set_result((pkg, len(data)))
+                    return
                 # keep the connection params here as we need the updated
                 # engine_id, engine_time, engine_boots for further requests
                 self._params = pkg.msgsecurityparameters
@@ -47,13 +123,22 @@ class SnmpV3Protocol(SnmpProtocol):
     def get_params(self):
         return self._params
 
+    def _pop_request(self, pid: int):
+        self.requests.pop(pid, None)
+        self._auth.pop(pid, None)
+
     async def _send_encrypted(self, pkg: SnmpV3Message,
                               auth_proto: Optional[Type[Auth]],
-                              auth_key: Optional[bytes],
+                              auth_hmac: Optional[hmac.HMAC],
                               priv_proto: Optional[Type[Priv]],
                               priv_key: Optional[bytes],
-                              timeout: Optional[float] = 10.0
+                              timeout: Optional[float] = 10.0,
+                              accept_report: bool = False
                               ) -> tuple[list[tuple[TOid, Tag, TValue]], int]:
+        """with accept_report an unauthenticated unknownEngineID report is
+        accepted (and raised as SnmpUnknownEngineId), use it only when a
+        new discovery is allowed; other unauthenticated packages are
+        ignored"""
         self._request_id += 1
         self._request_id %= 0x10000
 
@@ -61,17 +146,19 @@ class SnmpV3Protocol(SnmpProtocol):
         if priv_proto:
             pkg.msgflags = b'\x03'
             pkg.encrypt(priv_proto, priv_key)  # type: ignore
-            msg = pkg.encode_auth(auth_proto, auth_key)  # type: ignore
+            msg = pkg.encode_auth(auth_proto, auth_hmac)  # type: ignore
         elif auth_proto:
             pkg.msgflags = b'\x01'
-            msg = pkg.encode_auth(auth_proto, auth_key)  # type: ignore
+            msg = pkg.encode_auth(auth_proto, auth_hmac)  # type: ignore
         else:
             pkg.msgflags = b'\x00'
             msg = pkg.encode()
 
         fut = self.requests[pid] = self.loop.create_future()
-        fut.add_done_callback(
-            lambda _: self.requests.pop(pid) if pid in self.requests else None)
+        fut.add_done_callback(lambda _: self._pop_request(pid))
+        if auth_proto:
+            assert auth_hmac is not None
+            self._auth[pid] = (auth_proto, auth_hmac, accept_report)
 
         self.transport.sendto(msg, self.target)
 
@@ -86,7 +173,14 @@ class SnmpV3Protocol(SnmpProtocol):
         res, size = fut.result()
 
         if priv_proto and res.msgflags == b'\x03':
-            res.decrypt(priv_proto, priv_key)
+            if self._executor is not None and \
+                    size >= self._offload_threshold:
+                res.msgdata = await self.loop.run_in_executor(
+                    self._executor, decrypt_scopedpdu, priv_proto,
+                    priv_key, res.msgdata,  # type: ignore
+                    res.msgsecurityparameters)
+            else:
+                res.decrypt(priv_proto, priv_key)
 
         _, _, pdu = res.msgdata
         pdu_id, _, error_status, error_index, vbs = pdu
@@ -94,16 +188,22 @@ class SnmpV3Protocol(SnmpProtocol):
             msg = None
             if len(vbs) == 0:
                 msg = 'Received a report pdu'
-            else:
-                oid = vbs[0]
-                oidstr = '.'.join(map(str, oid))
-                msgfb = f'Received a report pdu `{oidstr}`'
-                msg = _REPORT_OID_EXCEPTIONS.get(oid, msgfb)
-            raise SnmpAuthV3Exception(msg)
+                raise SnmpAuthV3Exception(msg)
+            oid = vbs[0][0]
+            msgfb = f'Received a report pdu `{oid_to_str(oid)}`'
+            msg = _REPORT_OID_EXCEPTIONS.get(oid, msgfb)
+            exc = _REPORT_OID_EXCEPTION_CLASSES.get(oid, SnmpAuthV3Exception)
+            if exc is SnmpNotInTimeWindow:
+                # the report carries the engine boots and time of the agent
+                raise SnmpNotInTimeWindow(msg, res.msgsecurityparameters)
+            raise exc(msg)
 
         if pdu_id != _RESPONSE_PDU_ID:
             raise Exception('Expected a response pdu')
 
+        if auth_proto and not _is_authenticated(res):
+            raise SnmpAuthV3Exception('Received an unauthenticated response')
+
         if error_status != 0:
             oid = None
             if error_index != 0 and error_index < len(vbs):
@@ -117,14 +217,16 @@ class SnmpV3Protocol(SnmpProtocol):
 
     async def send_encrypted(self, pkg: SnmpV3Message,
                              auth_proto: Optional[Type[Auth]],
-                             auth_key: Optional[bytes],
+                             auth_hmac: Optional[hmac.HMAC],
                              priv_proto: Optional[Type[Priv]],
-                             priv_key: Optional[bytes]
+                             priv_key: Optional[bytes],
+                             accept_report: bool = False
                              ) -> tuple[list[tuple[TOid, Tag, TValue]], int]:
         for timeout in self._timeouts:
             try:
                 res = await self._send_encrypted(
-                    pkg, auth_proto, auth_key, priv_proto, priv_key, timeout)
+                    pkg, auth_proto, auth_hmac, priv_proto, priv_key,
+                    timeout, accept_report)
             except SnmpTimeoutError:
                 pass
             else:
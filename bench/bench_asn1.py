@@ -0,0 +1,126 @@
+"""Micro benchmarks for decoding integers and OIDs.
+
+Compares the decoder with the reference (python-asn1) implementations of
+`_decode_integer` and `_decode_object_identifier` on a GETBULK response
+shaped like the response of a switch to an ifXTable walk (there are no
+captured packets in the tree, see make_response).
+
+    python -m bench.bench_asn1
+"""
+import timeit
+from Crypto.Util.asn1 import DerObjectId, DerOctetString, DerSequence
+from asyncsnmplib.asn1 import Decoder, TOid
+from asyncsnmplib.package import Package
+
+IF_X_ENTRY = (1, 3, 6, 1, 2, 1, 31, 1, 1, 1)
+
+
+def ref_decode_integer(bytes_data: bytes) -> int:
+    values = [int(b) for b in bytes_data]
+    negative = values[0] & 0x80
+    if negative:
+        # make positive by taking two's complement
+        for i in range(len(values)):
+            values[i] = 0xFF - values[i]
+        for i in range(len(values) - 1, -1, -1):
+            values[i] += 1
+            if values[i] <= 0xFF:
+                break
+            values[i] = 0x00
+    value = 0
+    for val in values:
+        value = (value << 8) | val
+    if negative:
+        value = -value
+    return value
+
+
+def ref_decode_object_identifier(bytes_data: bytes) -> TOid:
+    result: list[int] = []
+    value: int = 0
+    for i in range(len(bytes_data)):
+        byte = int(bytes_data[i])
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            result.append(value)
+            value = 0
+    result = [result[0] // 40, result[0] % 40] + result[1:]
+    return tuple(result)
+
+
+def _app(nr: int, value: int) -> bytes:
+    """application type (Counter32, Gauge32, TimeTicks, Counter64)"""
+    data = value.to_bytes(value.bit_length() // 8 + 1, 'big')
+    return bytes((0x40 | nr, len(data))) + data
+
+
+def make_response(nrows: int = 10) -> bytes:
+    """GETBULK response of an ifXTable walk (6 columns, nrows repetitions)
+    with the interface indexes, value sizes and types of a switch
+
+    The varbinds are ordered like an agent returns them for a GETBULK with
+    one varbind per column: row by row, interleaved columns.
+    """
+    vbs: list[DerSequence] = []
+    for i in range(nrows):
+        # switch port indexes (for example 10101) need multi byte arcs
+        idx = 10101 + i
+        row = (
+            (1, DerOctetString(f'Gi1/0/{i + 1}'.encode())),
+            (6, _app(6, 98765432101234 + 7919 * i)),
+            (10, _app(6, 12345678901234 + 104729 * i)),
+            (15, _app(2, 1000)),
+            (18, DerOctetString(b'uplink to core' if i % 4 == 0 else b'')),
+            (19, _app(3, 0)),
+        )
+        for col, value in row:
+            oid = '.'.join(map(str, (*IF_X_ENTRY, col, idx)))
+            vbs.append(DerSequence([DerObjectId(oid), value]))
+    pdu = DerSequence([1234, 0, 0, DerSequence(vbs)], implicit=2)
+    return DerSequence([1, DerOctetString(b'public'), pdu]).encode()
+
+
+def bench(name: str, stmt: str, number: int, **glob: object):
+    res = min(timeit.repeat(stmt, globals=glob, number=number, repeat=5))
+    print(f'{name:<40} {res / number * 1e6:10.3f} us')
+    return res
+
+
+def main():
+    payload = make_response()
+
+    pkg = Package()
+    pkg.decode(payload)
+
+    counters = [b'\x00\xff\xff\xff\xff', b'\x1c\xbe\x99\x1a\x14',
+                b'\x01', b'\xff\x7f']
+    oids = [DerObjectId('.'.join(map(str, oid))).encode()[2:]
+            for oid, _, _ in pkg.variable_bindings]
+    oids.append(DerObjectId('1.3.6.1.4.1.2021.10.1.3.1').encode()[2:])
+
+    # correctness, the reference is signed for all integer types
+    for data in counters:
+        assert Decoder._decode_integer(data) == ref_decode_integer(data)
+    for data in oids:
+        assert Decoder._decode_object_identifier(data) == \
+            ref_decode_object_identifier(data)
+
+    n = 20_000
+    old = bench('reference integer', 'for d in c: f(d)', n,
+                c=counters, f=ref_decode_integer)
+    new = bench('integer', 'for d in c: f(d)', n,
+                c=counters, f=Decoder._decode_integer)
+    print(f'{"":<40} {old / new:10.1f} x')
+
+    old = bench('reference object identifier', 'for d in o: f(d)', 2_000,
+                o=oids, f=ref_decode_object_identifier)
+    new = bench('object identifier', 'for d in o: f(d)', 2_000,
+                o=oids, f=Decoder._decode_object_identifier)
+    print(f'{"":<40} {old / new:10.1f} x')
+
+    bench('package decode (60 varbinds)', 'Package().decode(p)', 2_000,
+          p=payload, Package=Package)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Micro benchmarks for SNMPv3 privacy, per message encrypt and decrypt cost.
+
+Compares with the reference implementations which create a cipher object
+per message and build the IV byte by byte.
+
+    python -m bench.bench_encr
+"""
+import os
+import struct
+import timeit
+from typing import Any
+from Crypto.Cipher import AES, DES
+from Crypto.Util.Padding import pad
+from asyncsnmplib.v3.encr import USM_PRIV_CBC56_DES, USM_PRIV_CFB128_AES
+
+
+def ref_get_pre_iv(engine_boots: int, engine_time: int):
+    return struct.pack(
+        'B' * 8,
+        engine_boots >> 24 & 0xff,
+        engine_boots >> 16 & 0xff,
+        engine_boots >> 8 & 0xff,
+        engine_boots & 0xff,
+        engine_time >> 24 & 0xff,
+        engine_time >> 16 & 0xff,
+        engine_time >> 8 & 0xff,
+        engine_time & 0xff
+    )
+
+
+def ref_decrypt_data_aes(key: bytes, data: bytes,
+                         msgsecurityparams: list[Any]):
+    pre_iv = ref_get_pre_iv(msgsecurityparams[1], msgsecurityparams[2])
+    iv = pre_iv + msgsecurityparams[5]
+    obj = AES.new(key[:16], AES.MODE_CFB, iv, segment_size=128)  # type: ignore
+    return obj.decrypt(pad(data, 16))
+
+
+def ref_decrypt_data(key: bytes, data: bytes, msgsecurityparams: list[Any]):
+    salt = msgsecurityparams[5]
+    des_key = key[:8]
+    iv = struct.pack('B' * 8, *map(lambda x, y: x ^ y, salt, key[8:16]))
+    obj = DES.new(des_key, DES.MODE_CBC, iv)  # type: ignore
+    return obj.decrypt(data)
+
+
+def bench(name: str, stmt: str, number: int, **glob: object):
+    res = min(timeit.repeat(stmt, globals=glob, number=number, repeat=5))
+    print(f'{name:<40} {res / number * 1e6:10.3f} us')
+    return res
+
+
+def main():
+    key = os.urandom(20)
+    params = [b'engine', 3, 123456, b'user', b'', b'']
+    n = 5_000
+
+    for size in (64, 1400, 8000):
+        data = os.urandom(size)
+
+        encrypted = USM_PRIV_CFB128_AES.encrypt(key, data, params)
+        assert ref_decrypt_data_aes(key, encrypted, params)[:size] == \
+            USM_PRIV_CFB128_AES.decrypt(key, encrypted, params)[:size]
+        bench(f'aes encrypt ({size} bytes)', 'f(k, d, p)', n,
+              f=USM_PRIV_CFB128_AES.encrypt, k=key, d=data, p=params)
+        old = bench(f'reference aes decrypt ({size} bytes)', 'f(k, d, p)',
+                    n, f=ref_decrypt_data_aes, k=key, d=encrypted, p=params)
+        new = bench(f'aes decrypt ({size} bytes)', 'f(k, d, p)', n,
+                    f=USM_PRIV_CFB128_AES.decrypt, k=key, d=encrypted,
+                    p=params)
+        print(f'{"":<40} {old / new:10.1f} x')
+
+        encrypted = USM_PRIV_CBC56_DES.encrypt(key, data, params)
+        assert ref_decrypt_data(key, encrypted, params) == \
+            USM_PRIV_CBC56_DES.decrypt(key, encrypted, params)
+        bench(f'des encrypt ({size} bytes)', 'f(k, d, p)', n,
+              f=USM_PRIV_CBC56_DES.encrypt, k=key, d=data, p=params)
+        old = bench(f'reference des decrypt ({size} bytes)', 'f(k, d, p)',
+                    n, f=ref_decrypt_data, k=key, d=encrypted, p=params)
+        new = bench(f'des decrypt ({size} bytes)', 'f(k, d, p)', n,
+                    f=USM_PRIV_CBC56_DES.decrypt, k=key, d=encrypted,
+                    p=params)
+        print(f'{"":<40} {old / new:10.1f} x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Micro benchmark for formatting table walks with on_result.
+
+Compares the compiled formatter plans and converters with the reference
+implementation which looks up each varbind in the MIB index and dispatches
+on the syntax type, on an ifTable walk with the MIBs of the test suite.
+
+    python -m bench.bench_format
+"""
+import os
+import timeit
+from typing import Any
+from asyncsnmplib.asn1 import TOid, TValue
+from asyncsnmplib.mib import mib_index
+from asyncsnmplib.mib.mib_index import MIB_INDEX
+from asyncsnmplib.mib.syntax_funs import SYNTAX_FUNS
+from asyncsnmplib.mib.utils import on_integer, on_octet_string, on_oid_map, \
+    on_result, on_value_map, on_value_map_b
+from asyncsnmplib.oid import oid_to_str
+
+IF_ENTRY = (1, 3, 6, 1, 2, 1, 2, 2, 1)
+MIB_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'test', 'mibs')
+
+
+def ref_on_syntax(syntax: dict[str, Any], value: TValue):
+    if syntax['tp'] == 'CUSTOM':
+        return SYNTAX_FUNS[syntax['func']](value)
+    elif syntax['tp'] == 'OCTET STRING':
+        return on_octet_string(value)
+    elif syntax['tp'] == 'OBJECT IDENTIFIER':
+        return on_oid_map(value)
+    elif syntax['tp'] == 'BITS':
+        return on_value_map_b(value, syntax['values'])
+    elif syntax['tp'] == 'INTEGER' and syntax.get('values'):
+        return on_value_map(value, syntax['values'])
+    elif syntax['tp'] == 'INTEGER':
+        return on_integer(value)
+    else:
+        raise Exception(f'Invalid syntax {syntax}')
+
+
+def ref_on_result(
+    base_oid: TOid,
+    result: list[tuple[TOid, TValue]],
+) -> tuple[str, list[dict[str, TValue]]]:
+    base = MIB_INDEX[base_oid]
+    base_name = result_name = base['name']
+    prefixlen = len(base_oid) + 1
+
+    if base_name.endswith('XEntry'):
+        result_name = base_name[:-5]
+        base_name = base_name[:-6]
+    elif base_name.endswith('Entry'):
+        base_name = result_name = base_name[:-5]
+
+    table: dict[TOid, dict[str, TValue]] = {}
+    for oid, value in result:
+        idx = oid[prefixlen:]
+        prefix = oid[:prefixlen]
+        if prefix not in MIB_INDEX:
+            continue
+        tp = MIB_INDEX[prefix]['tp']
+        if tp != 'OBJECT-TYPE':
+            continue
+        name = MIB_INDEX[prefix]['name']
+        _, _, lastpart = name.partition(base_name)
+        name = lastpart or name
+
+        syntax = MIB_INDEX[prefix]['syntax']
+        if idx not in table:
+            table[idx] = {'name': oid_to_str(idx)}
+        table[idx][name] = ref_on_syntax(syntax, value)
+
+    return result_name, list(table.values())
+
+
+def make_walk(nrows: int) -> list[tuple[TOid, Any]]:
+    columns: list[tuple[int, Any]] = [
+        (1, lambda i: i),
+        (2, lambda i: f'eth{i}'.encode()),
+        (3, lambda i: 6),
+        (6, lambda i: bytes((0, 0x1b, 0x21, 0, i >> 8 & 0xff, i & 0xff))),
+        (8, lambda i: 1),
+        (9, lambda i: 1234 * i),
+        (10, lambda i: 123456789 * i),
+    ]
+    return [
+        ((*IF_ENTRY, col, i), fun(i))
+        for col, fun in columns
+        for i in range(1, nrows + 1)]
+
+
+def main():
+    mib_index.MIB_CACHE_FILE = None
+    mib_index.set_mib_path(MIB_FOLDER)
+    mib_index.load_all()
+
+    for nrows in (10, 1000, 10000):
+        walk = make_walk(nrows)
+        assert ref_on_result(IF_ENTRY, walk) == on_result(IF_ENTRY, walk)
+        number = max(1, 10000 // nrows)
+        old = min(timeit.repeat(
+            lambda: ref_on_result(IF_ENTRY, walk), number=number, repeat=5))
+        new = min(timeit.repeat(
+            lambda: on_result(IF_ENTRY, walk), number=number, repeat=5))
+        print(f'{f"reference on_result ({nrows} rows)":<40} '
+              f'{old / number * 1e3:10.3f} ms')
+        print(f'{f"on_result ({nrows} rows)":<40} '
+              f'{new / number * 1e3:10.3f} ms')
+        print(f'{"":<40} {old / new:10.1f} x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import unittest
+from Crypto.Util.asn1 import DerInteger, DerObjectId, DerSequence
+from asyncsnmplib.asn1 import Decoder, Error, Number
+from asyncsnmplib.oid import oid_to_ber
+
+
+def tlv(nr: int, payload: bytes) -> bytes:
+    return bytes((nr, len(payload))) + payload
+
+
+class TestDecoder(unittest.TestCase):
+
+    def test_integer(self):
+        for value in (0, 1, 127, 128, 255, 256, -1, -128, -129, 2 ** 63,
+                      -2 ** 63, 0x7FFFFFFF, -0x80000000):
+            _, res = Decoder(DerInteger(value).encode()).read()
+            self.assertEqual(res, value)
+
+    def test_unsigned(self):
+        # properly encoded and without the leading zero byte which is
+        # returned by some agents
+        for data, value in (
+                (b'\x00\xff\xff\xff\xff', 0xFFFFFFFF),
+                (b'\xff\xff\xff\xff', 0xFFFFFFFF),
+                (b'\x00\xff' * 4 + b'\xff', 0xFF00FF00FF00FFFF),
+                (b'\x80', 128)):
+            for nr in (Number.Counter32, Number.Counter64, Number.Gauge32,
+                       Number.TimeTicks):
+                _, res = Decoder(tlv(nr, data)).read()
+                self.assertEqual(res, value)
+
+    def test_empty_integer(self):
+        with self.assertRaises(Error):
+            Decoder(tlv(Number.Integer, b'')).read()
+
+    def test_object_identifier(self):
+        for oid in (
+                (1, 3, 6, 1, 2, 1, 1, 1, 0),
+                (1, 3, 6, 1, 4, 1, 2021, 10, 1, 3, 1),
+                (0, 39, 127, 128, 16383, 16384, 2 ** 32 - 1),
+                (2, 39)):
+            encoded = DerObjectId('.'.join(map(str, oid))).encode()
+            _, res = Decoder(encoded).read()
+            self.assertEqual(res, oid)
+
+        # the second arc of 2 is not limited to 39, both in the single byte
+        # fast path and for larger first subidentifiers
+        for oid in ((2, 40), (2, 47, 1), (2, 999, 3), (2, 25), (2, 1600, 3),
+                    (2, 100000, 1)):
+            _, res = Decoder(oid_to_ber(oid)).read()
+            self.assertEqual(res, oid)
+
+    def test_object_identifier_invalid(self):
+        for data in (b'', b'\x80\x01', b'\x2b\x80\x01'):
+            with self.assertRaises(Error):
+                Decoder(tlv(Number.ObjectIdentifier, data)).read()
+
+    def test_long_length(self):
+        encoded = DerSequence([i for i in range(100)]).encode()
+        decoder = Decoder(encoded)
+        with decoder.enter():
+            values = [decoder.read()[1] for _ in range(100)]
+        self.assertEqual(values, list(range(100)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import unittest
+from typing import Iterable
+from asyncsnmplib.asn1 import Class, Number, Tag, TOid, Type
+from asyncsnmplib.client import Snmp
+
+IF_ENTRY = (1, 3, 6, 1, 2, 1, 2, 2, 1)
+TAG_INT = Tag(Number.Integer, Type.Primitive, Class.Universal)
+TAG_STR = Tag(Number.OctetString, Type.Primitive, Class.Universal)
+TAG_COUNTER = Tag(Number.Counter32 & 0x1F, Type.Primitive, Class.Application)
+TAG_END = Tag(Number.EndOfMibView & 0x1F, Type.Primitive, Class.Context)
+NROWS = 5
+
+
+def make_table():
+    table = []
+    for i in range(1, NROWS + 1):
+        table.append(((*IF_ENTRY, 1, i), TAG_INT, i))
+    for i in range(1, NROWS + 1):
+        table.append(((*IF_ENTRY, 2, i), TAG_STR, f'eth{i}'.encode()))
+    for i in range(1, NROWS + 1):
+        table.append(((*IF_ENTRY, 10, i), TAG_COUNTER, i * 1000))
+    table.append(((1, 3, 6, 1, 2, 1, 2, 3, 0), TAG_INT, 0))
+    return table
+
+
+class FakeSnmp(Snmp):
+    def __init__(self, table):
+        self.max_rows = 10_000
+        self.table = table
+
+    async def _get_bulk(self, oids: Iterable[TOid], max_repetitions: int = 20):
+        oid, = oids
+        vbs = [vb for vb in self.table if vb[0] > oid][:max_repetitions]
+        if len(vbs) < max_repetitions:
+            vbs.append(((1, 3, 6, 1, 6), TAG_END, None))
+        return vbs, 40 * len(vbs)
+
+
+class TestWalk(unittest.TestCase):
+
+    def test_walk(self):
+        cl = FakeSnmp(make_table())
+        rows = asyncio.run(cl.walk(IF_ENTRY, is_table=True))
+        self.assertEqual(len(rows), 3 * NROWS)
+        self.assertEqual(rows[0], ((*IF_ENTRY, 1, 1), 1))
+
+    def test_walk_relative(self):
+        cl = FakeSnmp(make_table())
+        rows = asyncio.run(cl.walk_relative(IF_ENTRY, is_table=True))
+        self.assertEqual(len(rows), 3 * NROWS)
+        self.assertEqual(rows[NROWS], (2, (1, ), b'eth1'))
+        # all columns of a row share the same index tuple
+        self.assertIs(rows[0][1], rows[NROWS][1])
+        self.assertIs(rows[0][1], rows[2 * NROWS][1])
+
+    def test_walk_columnar(self):
+        table = make_table()
+        # row 3 has no ifDescr (column 2)
+        del table[NROWS + 2]
+        cl = FakeSnmp(table)
+        res = asyncio.run(cl.walk_columnar(IF_ENTRY, is_table=True))
+        self.assertEqual(len(res), NROWS)
+        self.assertEqual(res.index[0], (1, ))
+        self.assertEqual(res.columns[1].values.typecode, 'q')
+        self.assertEqual(res.columns[10].values.typecode, 'Q')
+        self.assertEqual(list(res.columns[10].values),
+                         [i * 1000 for i in range(1, NROWS + 1)])
+        self.assertEqual(res.columns[2].values[2], None)
+        self.assertEqual(res.columns[2].missing, {2})
+        self.assertIsNone(res.columns[1].missing)
+
+    def test_walk_columnar_fallback(self):
+        table = make_table()
+        # a counter which does not fit an unsigned array
+        table[2 * NROWS] = (table[2 * NROWS][0], TAG_COUNTER, -1)
+        cl = FakeSnmp(table)
+        res = asyncio.run(cl.walk_columnar(IF_ENTRY, is_table=True))
+        self.assertIsInstance(res.columns[10].values, list)
+        self.assertEqual(res.columns[10].values[:2], [-1, 2000])
+
+
+if __name__ == '__main__':
+    unittest.main()
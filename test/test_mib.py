@@ -0,0 +1,639 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from typing import Any
+from asyncsnmplib.mib import mib_index
+from asyncsnmplib.mib.display_hint import compile_display_hint
+from asyncsnmplib.mib.mib import MibObject, NoNameError
+from asyncsnmplib.mib.mib_index import MIB_INDEX
+from asyncsnmplib.mib.resolver import oid_to_name, resolve
+from asyncsnmplib.mib.trie import OidTrie
+from asyncsnmplib.mib.utils import compile_index, compile_plan, \
+    compile_syntax, get_converter, on_result, on_result_base
+from asyncsnmplib.oid import oid_cache_clear, oid_cache_stats
+
+MIB_FOLDER = os.path.join(os.path.dirname(__file__), 'mibs')
+
+IF_ENTRY = (1, 3, 6, 1, 2, 1, 2, 2, 1)
+IF_X_ENTRY = (1, 3, 6, 1, 2, 1, 31, 1, 1, 1)
+ACME_OBJECTS = (1, 3, 6, 1, 4, 1, 99999, 1)
+ACME_VERSION = (*ACME_OBJECTS, 1)
+
+
+def reset_mib_index():
+    mib_index.MIB_PATH[:] = [MIB_FOLDER]
+    mib_index.MIB_CACHE_FILE = None
+    mib_index._REGISTERED.clear()
+    MIB_INDEX.clear()
+    MIB_INDEX.autoload = True
+
+
+def as_dict(index: dict[Any, Any]) -> dict[Any, Any]:
+    return {k: v.to_tuple() if isinstance(v, MibObject) else v
+            for k, v in index.items()}
+
+
+class TestMibIndex(unittest.TestCase):
+
+    def setUp(self):
+        reset_mib_index()
+
+    def test_load_by_name(self):
+        self.assertFalse(mib_index.is_loaded('IF-MIB'))
+        lk = MIB_INDEX['IF-MIB']
+        self.assertEqual(lk['ifName'], (*IF_X_ENTRY, 1))
+        # imports and RFC1213-MIB are loaded as well, other MIBs are not
+        for name in ('SNMPv2-SMI', 'SNMPv2-TC', 'RFC1213-MIB'):
+            self.assertTrue(mib_index.is_loaded(name))
+        self.assertFalse(mib_index.is_loaded('ACME-MIB'))
+        self.assertEqual(MIB_INDEX[(*IF_ENTRY, 3)]['name'], 'ifType')
+        # IF-MIB is loaded after RFC1213-MIB
+        self.assertEqual(MIB_INDEX[(*IF_ENTRY, 2)]['mib_name'], 'IF-MIB')
+
+    def test_autoload(self):
+        self.assertEqual(MIB_INDEX[ACME_VERSION]['name'], 'acmeVersion')
+        self.assertTrue(mib_index.is_loaded('IF-MIB'))
+        self.assertNotIn((1, 3, 6, 1, 4, 1, 12345), MIB_INDEX)
+        self.assertIsNone(MIB_INDEX.get((1, 3, 6, 1, 4, 1, 12345)))
+
+    def test_preload(self):
+        MIB_INDEX.autoload = False
+        mib_index.preload(['ACME-MIB'])
+        self.assertIn(ACME_VERSION, MIB_INDEX)
+        self.assertIsNone(MIB_INDEX.get((*IF_X_ENTRY, 1)))
+        self.assertFalse(mib_index.is_loaded('IF-MIB'))
+        with self.assertRaises(KeyError):
+            MIB_INDEX[(*IF_X_ENTRY, 1)]
+        with self.assertRaises(FileNotFoundError):
+            mib_index.preload(['NO-SUCH-MIB'])
+
+    def test_mib_object(self):
+        obj = MIB_INDEX[(*IF_X_ENTRY, 1)]
+        self.assertIsInstance(obj, MibObject)
+        self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertEqual(obj.oid, (*IF_X_ENTRY, 1))
+        self.assertEqual(obj['name'], 'ifName')
+        self.assertEqual(obj['mib_name'], 'IF-MIB')
+        self.assertEqual(obj['tp'], 'OBJECT-TYPE')
+        self.assertEqual(obj['syntax'],
+                         {'tp': 'CUSTOM', 'func': 'DisplayString'})
+        # read from the MIB when used
+        self.assertEqual(obj['description'], 'Test object 1.')
+        self.assertEqual(obj.get('value'), ['ifXEntry', 1])
+        self.assertIsNone(obj.get('units'))
+        self.assertNotIn('units', obj)
+        self.assertNotIn('index', obj)
+
+        entry = MIB_INDEX[IF_ENTRY]
+        self.assertEqual(entry['index'], ['ifIndex'])
+        self.assertEqual(MIB_INDEX[IF_X_ENTRY].augments, 'ifEntry')
+
+    def test_unknown_name(self):
+        self.assertNotIn('NO-SUCH-MIB', MIB_INDEX)
+        with self.assertRaises(KeyError):
+            MIB_INDEX['NO-SUCH-MIB']
+
+    def test_missing(self):
+        find_mib = mib_index._find_mib
+        lookups: list[str] = []
+
+        def _find_mib(mibname: str):
+            lookups.append(mibname)
+            return find_mib(mibname)
+        mib_index._find_mib = _find_mib
+        try:
+            self.assertNotIn('NO-SUCH-MIB', MIB_INDEX)
+            self.assertIsNone(MIB_INDEX.get('NO-SUCH-MIB'))
+            self.assertFalse(mib_index.mib_exists('NO-SUCH-MIB'))
+            self.assertEqual(lookups, ['NO-SUCH-MIB'])
+
+            # a changed MIB_PATH is looked up again
+            tmp = tempfile.mkdtemp()
+            try:
+                with open(os.path.join(tmp, 'NO-SUCH-MIB.json'), 'w') as f:
+                    json.dump({'IMPORTS': []}, f)
+                mib_index.add_mib_dir(tmp)
+                self.assertIn('NO-SUCH-MIB', MIB_INDEX)
+            finally:
+                shutil.rmtree(tmp)
+        finally:
+            mib_index._find_mib = find_mib
+
+
+class TestMibCache(unittest.TestCase):
+
+    def setUp(self):
+        reset_mib_index()
+        self.tmp = tempfile.mkdtemp()
+        self.folder = os.path.join(self.tmp, 'mibs')
+        mib_index.MIB_PATH[:] = [self.folder]
+        mib_index.MIB_CACHE_FILE = '../index.cache'
+        shutil.copytree(MIB_FOLDER, self.folder)
+        self.read_mib = mib_index._read_mib
+        self.loaded: list[str] = []
+
+        def read_mib(mibname: str):
+            self.loaded.append(mibname)
+            self.read_mib(mibname)
+        mib_index._read_mib = read_mib
+
+    def tearDown(self):
+        mib_index._read_mib = self.read_mib
+        shutil.rmtree(self.tmp)
+        reset_mib_index()
+
+    def test_cache(self):
+        mib_index.load_all()
+        self.assertEqual(len(self.loaded), 6)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, 'index.cache')))
+        expected = as_dict(MIB_INDEX)
+
+        MIB_INDEX.clear()
+        self.loaded.clear()
+        mib_index.load_all()
+        self.assertEqual(self.loaded, [])
+        self.assertEqual(as_dict(MIB_INDEX), expected)
+        syntax = MIB_INDEX[(*IF_ENTRY, 3)]['syntax']
+        self.assertEqual(syntax['values'][6], 'ethernetCsmacd')
+
+    def test_owners(self):
+        mib_index.load_all()
+        expected = as_dict(MIB_INDEX)
+        MIB_INDEX.clear()
+        self.loaded.clear()
+
+        # only the MIB which defines the OID and its imports are loaded
+        self.assertEqual(MIB_INDEX[ACME_VERSION]['name'], 'acmeVersion')
+        self.assertIn('ACME-MIB', self.loaded)
+        self.assertFalse(mib_index.is_loaded('IF-MIB'))
+        self.assertEqual(MIB_INDEX[(*IF_X_ENTRY, 1)]['name'], 'ifName')
+        self.assertTrue(mib_index.is_loaded('IF-MIB'))
+
+        # an OID which is not in the cache loads nothing and is remembered
+        self.loaded.clear()
+        self.assertNotIn((1, 3, 6, 1, 4, 1, 12345), MIB_INDEX)
+        self.assertEqual(self.loaded, [])
+        self.assertFalse(MIB_INDEX._complete)
+        read_owners = mib_index._read_owners
+        mib_index._read_owners = None  # type: ignore
+        try:
+            self.assertIsNone(MIB_INDEX.get((1, 3, 6, 1, 4, 1, 12345)))
+        finally:
+            mib_index._read_owners = read_owners
+
+        mib_index.load_all()
+        self.assertEqual(self.loaded, [])
+        self.assertEqual(as_dict(MIB_INDEX), expected)
+
+    def test_owners_find(self):
+        mib_index.load_all()
+        MIB_INDEX.clear()
+        self.loaded.clear()
+
+        obj, idx = MIB_INDEX.find((*IF_X_ENTRY, 6, 10101))  # type: ignore
+        self.assertEqual((obj.name, idx), ('ifHCInOctets', (10101, )))
+        self.assertIn('IF-MIB', self.loaded)
+        self.assertFalse(mib_index.is_loaded('ACME-MIB'))
+        self.assertFalse(MIB_INDEX._complete)
+
+        # an OID which is not in the cache loads nothing
+        self.loaded.clear()
+        self.assertIsNone(MIB_INDEX.find((2, 999, 1)))
+        self.assertEqual(oid_to_name((*ACME_VERSION, 0)), 'acmeVersion.0')
+        self.assertEqual(self.loaded, ['ACME-MIB'])
+
+    def test_owners_invalid(self):
+        mib_index.load_all()
+        path = os.path.join(self.folder, 'ACME-MIB.json')
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+        # without a valid cache all MIBs are loaded
+        MIB_INDEX.clear()
+        self.loaded.clear()
+        mib_index.set_mib_path(self.folder)
+        self.assertEqual(MIB_INDEX[ACME_VERSION]['name'], 'acmeVersion')
+        self.assertEqual(len(self.loaded), 6)
+        self.assertTrue(MIB_INDEX._complete)
+
+    def test_invalidate(self):
+        mib_index.load_all()
+        path = os.path.join(self.folder, 'ACME-MIB.json')
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+        MIB_INDEX.clear()
+        self.loaded.clear()
+        mib_index.load_all()
+        self.assertEqual(len(self.loaded), 6)
+
+        # the cache is written again
+        MIB_INDEX.clear()
+        self.loaded.clear()
+        mib_index.load_all()
+        self.assertEqual(self.loaded, [])
+
+    def test_corrupt(self):
+        with open(os.path.join(self.tmp, 'index.cache'), 'wb') as f:
+            f.write(b'corrupt')
+        with self.assertLogs(level='WARNING'):
+            mib_index.load_all()
+        self.assertEqual(len(self.loaded), 6)
+
+
+class TestOidTrie(unittest.TestCase):
+
+    def test_trie(self):
+        trie = OidTrie()
+        trie[(1, 3, 6)] = 'dod'
+        trie[(1, 3, 6, 1, 2)] = 'mgmt'
+        self.assertEqual(len(trie), 2)
+        self.assertEqual(trie.longest_prefix((1, 3, 6, 1, 2, 1)),
+                         ('mgmt', (1, )))
+        self.assertEqual(trie.longest_prefix((1, 3, 6, 1)), ('dod', (1, )))
+        self.assertEqual(trie.longest_prefix((1, 3, 6)), ('dod', ()))
+        self.assertIsNone(trie.longest_prefix((1, 3)))
+        self.assertIsNone(trie.get((1, 3, 6, 1)))
+        self.assertEqual(list(trie.items()),
+                         [((1, 3, 6), 'dod'), ((1, 3, 6, 1, 2), 'mgmt')])
+
+        del trie[(1, 3, 6, 1, 2)]
+        self.assertEqual(trie.longest_prefix((1, 3, 6, 1, 2, 1)),
+                         ('dod', (1, 2, 1)))
+        self.assertEqual(list(trie.items((1, 3, 6, 1))), [])
+        with self.assertRaises(KeyError):
+            del trie[(1, 3, 6, 1)]
+
+    def test_find(self):
+        reset_mib_index()
+        obj, idx = MIB_INDEX.find((*IF_X_ENTRY, 6, 10101))  # type: ignore
+        self.assertEqual((obj.name, idx), ('ifHCInOctets', (10101, )))
+        obj, idx = MIB_INDEX.find(  # type: ignore
+            (*ACME_OBJECTS, 3, 1, 2, 3, 99, 112, 117))
+        self.assertEqual(obj.name, 'acmeSensorValue')
+        self.assertEqual(idx, (3, 99, 112, 117))
+        self.assertEqual(len(MIB_INDEX.trie), len(
+            [v for v in MIB_INDEX.values() if isinstance(v, MibObject)]))
+
+        MIB_INDEX.clear()
+        self.assertEqual(len(MIB_INDEX.trie), 0)
+
+
+class TestResolver(unittest.TestCase):
+
+    def setUp(self):
+        reset_mib_index()
+
+    def test_resolve(self):
+        self.assertEqual(resolve('IF-MIB::ifHCInOctets.12'),
+                         (*IF_X_ENTRY, 6, 12))
+        self.assertEqual(resolve('ifHCInOctets'), (*IF_X_ENTRY, 6))
+        self.assertEqual(resolve('acmeVersion.0'), (*ACME_VERSION, 0))
+        self.assertEqual(resolve('.1.3.6.1'), (1, 3, 6, 1))
+        self.assertEqual(resolve('1.3.6.1.2'), (1, 3, 6, 1, 2))
+        self.assertEqual(resolve('iso.3'), (1, 3))
+
+        with self.assertRaises(NoNameError):
+            resolve('IF-MIB::acmeVersion')
+        with self.assertRaises(NoNameError):
+            resolve('NO-MIB::ifIndex')
+        with self.assertRaises(NoNameError):
+            resolve('noName')
+        for text in ('', 'ifIndex.x', '1..3', 'ifIndex.-1'):
+            with self.assertRaises(ValueError):
+                resolve(text)
+
+    def test_oid_to_name(self):
+        oid = (*IF_X_ENTRY, 6, 12)
+        self.assertEqual(oid_to_name(oid), 'ifHCInOctets.12')
+        self.assertEqual(oid_to_name(oid, with_mib=True),
+                         'IF-MIB::ifHCInOctets.12')
+        self.assertEqual(oid_to_name(ACME_OBJECTS), 'acmeObjects')
+        self.assertEqual(oid_to_name((2, 999)), '2.999')
+
+    def test_reload(self):
+        MIB_INDEX.autoload = False
+        self.assertEqual(oid_to_name(ACME_VERSION), '1.3.6.1.4.1.99999.1.1')
+        with self.assertRaises(NoNameError):
+            resolve('acmeVersion')
+        # the cached results are not used after the index is changed
+        mib_index.preload(['ACME-MIB'])
+        self.assertEqual(oid_to_name(ACME_VERSION), 'acmeVersion')
+        self.assertEqual(resolve('acmeVersion'), ACME_VERSION)
+
+
+class TestFormat(unittest.TestCase):
+
+    def setUp(self):
+        reset_mib_index()
+
+    def test_on_result(self):
+        oid_cache_clear()
+        result = [
+            ((*IF_ENTRY, 2, 1), b'lo'),
+            ((*IF_ENTRY, 2, 2), b'eth0'),
+            ((*IF_ENTRY, 3, 1), 24),
+            ((*IF_ENTRY, 3, 2), 6),
+            ((*IF_ENTRY, 99, 1), 0),  # not in the MIB
+        ]
+        name, rows = on_result(IF_ENTRY, result)
+        self.assertEqual(name, 'if')
+        self.assertEqual(rows, [
+            {'name': '1', 'Descr': 'lo', 'Type': 'softwareLoopback'},
+            {'name': '2', 'Descr': 'eth0', 'Type': 'ethernetCsmacd'},
+        ])
+        # row indexes are not kept in the OID cache
+        self.assertEqual(oid_cache_stats()['str']['size'], 0)
+        name, rows = on_result_base(IF_ENTRY, result[:1])
+        self.assertEqual((name, rows),
+                         ('ifEntry', [{'name': '1', 'ifDescr': 'lo'}]))
+
+        name, rows = on_result(IF_X_ENTRY, [((*IF_X_ENTRY, 1, 7), b'eth6')])
+        self.assertEqual(name, 'ifX')
+        self.assertEqual(rows, [{'name': '7', 'Name': 'eth6'}])
+
+    def test_outside_table(self):
+        result = [
+            ((*IF_ENTRY, 2, 1), b'lo'),
+            (IF_ENTRY, 0),  # too short
+            ((1, 3, 6), 0),  # too short
+            ((*IF_X_ENTRY, 1, 7), b'eth6'),  # other table, same column
+            ((*ACME_OBJECTS, 2, 1), 0),  # outside the table
+        ]
+        name, rows = on_result(IF_ENTRY, result)
+        self.assertEqual(rows, [{'name': '1', 'Descr': 'lo'}])
+
+    def test_plan(self):
+        _, plan = compile_plan(IF_ENTRY)
+        self.assertIs(compile_plan(IF_ENTRY)[1], plan)
+        self.assertEqual(plan[2][0], 'Descr')
+        self.assertNotIn(99, plan)
+
+        # the plan is compiled again after the MIB index is changed
+        mib_index.register_mib('TEST-MIB', TEST_MIB)
+        self.assertIsNot(compile_plan(IF_ENTRY)[1], plan)
+
+
+class TestConverter(unittest.TestCase):
+
+    def test_compile_syntax(self):
+        conv = compile_syntax({'tp': 'INTEGER', 'values': {1: 'up'}})
+        self.assertEqual(conv(1), 'up')
+        self.assertIsNone(conv(3))
+        conv = compile_syntax({'tp': 'BITS', 'values': {0: 'a', 9: 'b'}})
+        self.assertEqual(conv(b'\x01\x02'), 'a,b')
+        self.assertEqual(conv(b'\x01'), 'a')
+        conv = compile_syntax({'tp': 'CUSTOM', 'func': 'PhysAddress'})
+        self.assertEqual(conv(b'\x00\x1b'), '00:1b')
+        conv = compile_syntax({'tp': 'SEQUENCE'})
+        with self.assertRaises(Exception):
+            conv(1)
+
+    def test_wrong_type(self):
+        reset_mib_index()
+        # values are converted by their type when an agent does not follow
+        # the syntax of the MIB
+        conv = compile_syntax({'tp': 'OBJECT IDENTIFIER'})
+        self.assertEqual(conv(4), 4)
+        self.assertEqual(conv(ACME_VERSION), 'acmeVersion')
+        conv = compile_syntax({'tp': 'INTEGER', 'values': {1: 'up'}})
+        self.assertEqual(conv(b'up'), 'up')
+        conv = compile_syntax({'tp': 'BITS', 'values': {0: 'a'}})
+        self.assertEqual(conv(1), 1)
+        conv = compile_syntax({'tp': 'OCTET STRING'})
+        self.assertEqual(conv((1, 3, 6, 1, 2, 99)), '1.3.6.1.2.99')
+        conv = compile_syntax({'tp': 'CUSTOM', 'func': 'DisplayString'})
+        self.assertEqual(conv(7), 7)
+        conv = compile_syntax({'tp': 'CUSTOM', 'func': 'IpAddress'})
+        self.assertEqual(conv(ACME_VERSION), 'acmeVersion')
+        conv = compile_syntax({'tp': 'CUSTOM', 'func': 'TruthValue'})
+        self.assertEqual(conv(b'yes'), 'yes')
+        conv = compile_syntax({'tp': 'CUSTOM', 'func': 'TimeTicks'})
+        self.assertIsNone(conv(b'Not Available'))
+
+        # a wrong type does not abort the table
+        name, rows = on_result(IF_X_ENTRY, [
+            ((*IF_X_ENTRY, 1, 1), b'lo'),
+            ((*IF_X_ENTRY, 1, 2), 2),
+        ])
+        self.assertEqual(rows, [
+            {'name': '1', 'Name': 'lo'},
+            {'name': '2', 'Name': 2},
+        ])
+
+    def test_mib_object(self):
+        reset_mib_index()
+        obj = MIB_INDEX[(*IF_ENTRY, 8)]
+        conv = get_converter(obj)
+        self.assertIs(get_converter(obj), conv)
+        self.assertEqual(conv(2), 'down')
+
+
+class TestDisplayHint(unittest.TestCase):
+
+    def test_display_hint(self):
+        tests = (
+            ('1x:', b'\x00\x1b\xff', '00:1b:ff'),
+            ('1d.1d.1d', b'\x01\x02\x03', '1.2.3'),
+            ('255a', b'eth0', 'eth0'),
+            ('255t', 'caf\u00e9'.encode(), 'caf\u00e9'),
+            ('2x', b'\x01\x02\x03', '010203'),
+            ('1o', b'\x08', '10'),
+            ('2d-1d-1d,1d:1d:1d.1d,1a1d:1d',
+             b'\x07\xe8\x01\x02\x0d\x1e\x0f\x00+\x02\x00',
+             '2024-1-2,13:30:15.0,+2:0'),
+            # the last specification is used until the value is exhausted
+            ('1d.', b'\x0a\x00\x00\x01', '10.0.0.1'),
+            # repeat indicator with terminator
+            ('*1x:/1d', b'\x02\xaa\xbb\x07', 'aa:bb/7'),
+            ('1x:', b'', ''),
+        )
+        for hint, value, expected in tests:
+            self.assertEqual(compile_display_hint(hint)(value), expected)
+        self.assertIs(compile_display_hint('1x:'), compile_display_hint('1x:'))
+
+        for hint in ('', 'x', '0d', '1q', '*:'):
+            with self.assertRaises(ValueError):
+                compile_display_hint(hint)
+
+    def test_textual_convention(self):
+        reset_mib_index()
+        obj = MIB_INDEX[ACME_VERSION]
+        self.assertEqual(obj.syntax['display-hint'], '1d.1d.1d')
+        self.assertEqual(get_converter(obj)(b'\x01\x02\x03'), '1.2.3')
+        # custom textual conventions have precedence over display hints
+        obj = MIB_INDEX[(*IF_ENTRY, 6)]
+        self.assertEqual(obj.syntax['tp'], 'CUSTOM')
+
+        with self.assertLogs(level='WARNING'):
+            conv = compile_syntax(
+                {'tp': 'OCTET STRING', 'display-hint': '1q'})
+        self.assertEqual(conv(b'abc'), 'abc')
+
+
+INDEX_MIB = {
+    'IMPORTS': [
+        ['SNMPv2-SMI', ['OBJECT-TYPE', 'Integer32', 'IpAddress',
+                        'enterprises']],
+        ['SNMPv2-TC', ['DisplayString']],
+    ],
+    'idx': {'tp': 'OBJECT IDENTIFIER', 'value': ['enterprises', 54321]},
+    'addrEntry': {'tp': 'OBJECT-TYPE', 'value': ['idx', 1],
+                  'syntax': {'tp': 'SEQUENCE'},
+                  'index': ['addrType', 'addr', 'IMPLIED addrName']},
+    'addrType': {'tp': 'OBJECT-TYPE', 'value': ['addrEntry', 1],
+                 'syntax': {'tp': 'INTEGER', 'values': {
+                     '0': 'unknown', '1': 'ipv4', '2': 'ipv6', '3': 'ipv4z',
+                     '4': 'ipv6z', '16': 'dns'}}},
+    'addr': {'tp': 'OBJECT-TYPE', 'value': ['addrEntry', 2],
+             'syntax': {'tp': 'OCTET STRING'}},
+    'addrName': {'tp': 'OBJECT-TYPE', 'value': ['addrEntry', 3],
+                 'syntax': {'tp': 'DisplayString'}},
+    'peerEntry': {'tp': 'OBJECT-TYPE', 'value': ['idx', 2],
+                  'syntax': {'tp': 'SEQUENCE'},
+                  'index': ['peerAddr', 'peerPort', 'peerId']},
+    'peerAddr': {'tp': 'OBJECT-TYPE', 'value': ['peerEntry', 1],
+                 'syntax': {'tp': 'IpAddress'}},
+    'peerPort': {'tp': 'OBJECT-TYPE', 'value': ['peerEntry', 2],
+                 'syntax': {'tp': 'Integer32'}},
+    'peerId': {'tp': 'OBJECT-TYPE', 'value': ['peerEntry', 3],
+               'syntax': {'tp': 'OBJECT IDENTIFIER'}},
+    'peerXEntry': {'tp': 'OBJECT-TYPE', 'value': ['idx', 3],
+                   'syntax': {'tp': 'SEQUENCE'}, 'augments': 'peerEntry'},
+    'peerState': {'tp': 'OBJECT-TYPE', 'value': ['peerXEntry', 1],
+                  'syntax': {'tp': 'Integer32'}},
+}
+ADDR_ENTRY = (1, 3, 6, 1, 4, 1, 54321, 1)
+PEER_ENTRY = (1, 3, 6, 1, 4, 1, 54321, 2)
+PEER_X_ENTRY = (1, 3, 6, 1, 4, 1, 54321, 3)
+
+
+class TestTableIndex(unittest.TestCase):
+
+    def setUp(self):
+        reset_mib_index()
+        mib_index.register_mib('INDEX-MIB', INDEX_MIB)
+
+    def tearDown(self):
+        reset_mib_index()
+
+    def test_inet_address(self):
+        decode = compile_index(ADDR_ENTRY)
+        self.assertEqual(decode((1, 4, 10, 0, 0, 1, 101, 116, 104)),
+                         ('ipv4', '10.0.0.1', 'eth'))
+        self.assertEqual(decode((2, 16, 254, 128, *[0] * 13, 1)),
+                         ('ipv6', 'fe80::1', ''))
+        self.assertEqual(decode((4, 20, 254, 128, *[0] * 13, 1, 0, 0, 0, 3)),
+                         ('ipv6z', 'fe80::1%3', ''))
+        self.assertEqual(decode((16, 3, 97, 46, 98)), ('dns', 'a.b', ''))
+        # too short
+        self.assertEqual(decode((1, 4, 10, 0)), (1, 4, 10, 0))
+
+    def test_index(self):
+        decode = compile_index(PEER_ENTRY)
+        self.assertEqual(decode((10, 0, 0, 1, 179, 2, 1, 3)),
+                         ('10.0.0.1', 179, 'org'))
+        # trailing arcs
+        self.assertEqual(decode((10, 0, 0, 1, 179, 2, 1, 3, 9)),
+                         (10, 0, 0, 1, 179, 2, 1, 3, 9))
+        # AUGMENTS tables have the index of the augmented table
+        decode = compile_index(PEER_X_ENTRY)
+        self.assertEqual(decode((10, 0, 0, 1, 179, 0)), ('10.0.0.1', 179, ''))
+
+    def test_on_result(self):
+        name, rows = on_result(PEER_X_ENTRY, [
+            ((*PEER_X_ENTRY, 1, 10, 0, 0, 1, 179, 0), 6),
+        ], typed_index=True)
+        self.assertEqual(rows, [{
+            'name': '10.0.0.1.179.0',
+            'index': ('10.0.0.1', 179, ''),
+            'State': 6,
+        }])
+        name, rows = on_result(IF_ENTRY, [((*IF_ENTRY, 2, 3), b'eth2')],
+                               typed_index=True)
+        self.assertEqual(rows[0]['index'], (3, ))
+        name, rows = on_result(IF_ENTRY, [((*IF_ENTRY, 2, 3), b'eth2')])
+        self.assertNotIn('index', rows[0])
+
+
+TEST_MIB = {
+    'IMPORTS': [['SNMPv2-SMI', ['OBJECT-TYPE', 'Integer32', 'enterprises']]],
+    'test': {'tp': 'OBJECT IDENTIFIER', 'value': ['enterprises', 12345]},
+    'testValue': {'tp': 'OBJECT-TYPE', 'value': ['test', 1],
+                  'syntax': {'tp': 'Integer32'}},
+}
+
+
+class TestMibPath(unittest.TestCase):
+
+    def setUp(self):
+        reset_mib_index()
+        self.tmp = tempfile.mkdtemp()
+        self.read_mib = mib_index._read_mib
+        self.loaded: list[str] = []
+
+        def read_mib(mibname: str):
+            self.loaded.append(mibname)
+            self.read_mib(mibname)
+        mib_index._read_mib = read_mib
+
+        # vendor overlay with a fixed ACME-MIB and a new MIB
+        with open(os.path.join(MIB_FOLDER, 'ACME-MIB.json')) as f:
+            mib = json.load(f)
+        mib['acmeTemperature']['value'] = ['acmeObjects', 4]
+        with open(os.path.join(self.tmp, 'ACME-MIB.json'), 'w') as f:
+            json.dump(mib, f)
+        with open(os.path.join(self.tmp, 'TEST-MIB.json'), 'w') as f:
+            json.dump(TEST_MIB, f)
+
+    def tearDown(self):
+        mib_index._read_mib = self.read_mib
+        shutil.rmtree(self.tmp)
+        reset_mib_index()
+
+    def test_overlay(self):
+        mib_index.add_mib_dir(self.tmp)
+        self.assertEqual(mib_index.MIB_PATH, [self.tmp, MIB_FOLDER])
+        lk = MIB_INDEX['ACME-MIB']
+        self.assertEqual(lk['acmeTemperature'][-1], 4)
+        self.assertIn('TEST-MIB', MIB_INDEX)
+
+    def test_incremental(self):
+        mib_index.load_all()
+        self.assertIn((*ACME_OBJECTS, 2), MIB_INDEX)
+        self.loaded.clear()
+
+        mib_index.add_mib_dir(self.tmp)
+        self.assertEqual(sorted(self.loaded), ['ACME-MIB', 'TEST-MIB'])
+        self.assertEqual(
+            MIB_INDEX[(*ACME_OBJECTS, 4)]['name'], 'acmeTemperature')
+        self.assertIsNone(MIB_INDEX.get((*ACME_OBJECTS, 2)))
+        self.assertEqual(
+            MIB_INDEX[(1, 3, 6, 1, 4, 1, 12345, 1)]['name'], 'testValue')
+
+        self.loaded.clear()
+        mib_index.set_mib_path(MIB_FOLDER)
+        self.assertEqual(self.loaded, ['ACME-MIB'])
+        self.assertIn((*ACME_OBJECTS, 2), MIB_INDEX)
+
+    def test_register(self):
+        mib_index.register_mib('TEST-MIB', TEST_MIB)
+        self.assertEqual(
+            MIB_INDEX['TEST-MIB']['testValue'], (1, 3, 6, 1, 4, 1, 12345, 1))
+        self.assertIn('TEST-MIB', self.loaded)
+        self.assertIn('IMPORTS', TEST_MIB)
+
+        # replace
+        mib = json.loads(json.dumps(TEST_MIB))
+        mib['testValue']['value'] = ['test', 2]
+        mib_index.register_mib('TEST-MIB', mib)
+        self.assertEqual(
+            MIB_INDEX[(1, 3, 6, 1, 4, 1, 12345, 2)]['name'], 'testValue')
+        self.assertFalse(
+            MIB_INDEX.is_loaded((1, 3, 6, 1, 4, 1, 12345, 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
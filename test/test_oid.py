@@ -0,0 +1,36 @@
+import unittest
+from Crypto.Util.asn1 import DerObjectId
+from asyncsnmplib.oid import oid_to_ber, oid_to_str, oid_cache_stats
+
+OIDS = [
+    (0, 0),
+    (1, 3, 6, 1, 2, 1, 1, 1, 0),
+    (1, 3, 6, 1, 4, 1, 2021, 10, 1, 3, 1),
+    (1, 3, 6, 1, 4, 1, 9, 9, 13, 1, 3, 1, 2 ** 32 - 1),
+    (2, 999, 1),
+    (1, 3, 6, 1, 2, 1, 4, 34, 1, 3, 1, 4) + tuple(range(100, 160)),
+]
+
+
+class TestOid(unittest.TestCase):
+
+    def test_ber(self):
+        for oid in OIDS:
+            expected = DerObjectId('.'.join(map(str, oid))).encode()
+            self.assertEqual(oid_to_ber(oid), expected)
+
+    def test_invalid(self):
+        for oid in ((1, ), (3, 1), (1, 40)):
+            with self.assertRaises(ValueError):
+                oid_to_ber(oid)
+
+    def test_str(self):
+        self.assertEqual(oid_to_str((1, 3, 6, 1)), '1.3.6.1')
+        oid_to_str((1, 3, 6, 1))
+        stats = oid_cache_stats()['str']
+        self.assertGreaterEqual(stats['hits'], 1)
+        self.assertGreater(stats['hit_rate'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from asyncsnmplib.package import SnmpMessage, SnmpPreparedMessage
+from asyncsnmplib.pdu import SnmpGet, SnmpGetBulk
+
+OIDS = [
+    (1, 3, 6, 1, 2, 1, 1, 1, 0),
+    (1, 3, 6, 1, 2, 1, 31, 1, 1, 1, 6),
+]
+REQUEST_IDS = (0, 1, 127, 128, 255, 256, 0x7FFF, 0x8000, 0xFFFF)
+
+
+class TestPreparedMessage(unittest.TestCase):
+
+    def _check(self, pdu_cl, **kwargs):
+        prepared = SnmpPreparedMessage(
+            1, b'public', pdu_cl(variable_bindings=OIDS, **kwargs))
+        for request_id in REQUEST_IDS:
+            pkg = SnmpMessage.make(
+                1, b'public', pdu_cl(variable_bindings=OIDS, **kwargs))
+            pkg.request_id = request_id
+            prepared.request_id = request_id
+            self.assertEqual(prepared.encode(), pkg.encode())
+
+    def test_get(self):
+        self._check(SnmpGet)
+
+    def test_get_bulk(self):
+        self._check(SnmpGetBulk, max_repetitions=40)
+
+    def test_long_message(self):
+        # more than 127 bytes requires a long form length field
+        oids = [(1, 3, 6, 1, 4, 1, 9, 9, 13, 1, 3, 1, i) for i in range(30)]
+        prepared = SnmpPreparedMessage(
+            1, b'public', SnmpGet(variable_bindings=oids))
+        pkg = SnmpMessage.make(1, b'public', SnmpGet(variable_bindings=oids))
+        pkg.request_id = prepared.request_id = 0x8000
+        self.assertEqual(prepared.encode(), pkg.encode())
+
+
+if __name__ == '__main__':
+    unittest.main()
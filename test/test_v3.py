@@ -0,0 +1,688 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from Crypto.Cipher import AES, DES
+from asyncsnmplib.client import SnmpV3
+from asyncsnmplib.exceptions import (
+    SnmpAuthV3Exception, SnmpNotInTimeWindow, SnmpTimeoutError,
+    SnmpUnknownEngineId)
+from asyncsnmplib.pdu import PDU, SnmpGet, ScopedPDU
+from asyncsnmplib.v3 import keycache
+from asyncsnmplib.v3.auth import (
+    AUTH_PROTO, USM_AUTH_HMAC96_SHA, prepare_hmac)
+from asyncsnmplib.v3.cache import REDISCOVERY_INTERVAL, SnmpV3Cache
+from asyncsnmplib.v3.engine_store import SnmpV3EngineStore
+from asyncsnmplib.v3.encr import (
+    PRIV_PROTO, USM_PRIV_CBC56_DES, USM_PRIV_CFB128_AES, USM_PRIV_CFB256_AES)
+from asyncsnmplib.v3.package import Package, SnmpV3Message
+from asyncsnmplib.v3.protocol import SnmpV3Protocol
+from asyncsnmplib.v3.usm import UsmSecurityParameters
+
+ENGINE_ID = b'\x80\x00\x1f\x88\x80\x1b\x92\x3c\x21\x6f\x3a\x58\x5e'
+OIDS = [(1, 3, 6, 1, 2, 1, 1, 1, 0), (1, 3, 6, 1, 2, 1, 1, 3, 0)]
+
+
+def make_message(user: bytes = b'user1', msgflags: bytes = b'\x01'):
+    pdu = SnmpGet(variable_bindings=OIDS)
+    spdu = ScopedPDU(pdu, ENGINE_ID)
+    params = [ENGINE_ID, 3, 123456, user, b'', b'']
+    msg = SnmpV3Message.make(spdu, params)
+    msg.msgflags = msgflags
+    msg.request_id = 42
+    return msg
+
+
+def encode_auth_twice(msg: SnmpV3Message, proto, key: bytes):
+    msg.msgsecurityparameters[4] = b'\x00' * proto.sz
+    digest = proto.auth(key, msg.encode())
+    msg.msgsecurityparameters[4] = digest[:proto.sz]
+    return msg.encode()
+
+
+class TestAuth(unittest.TestCase):
+
+    def test_encode_auth(self):
+        for proto in AUTH_PROTO.values():
+            key = proto.localize(proto.hash_passphrase('Password1'),
+                                 ENGINE_ID)
+            for user in (b'user1', b'u' * 200):
+                msg = make_message(user)
+                expected = encode_auth_twice(make_message(user), proto, key)
+                mac = prepare_hmac(key, proto.hash_func)
+                self.assertEqual(msg.encode_auth(proto, mac), expected)
+
+    def test_encode_auth_priv(self):
+        proto = AUTH_PROTO['USM_AUTH_HMAC96_SHA']
+        key = proto.localize(proto.hash_passphrase('Password1'), ENGINE_ID)
+        msg = make_message(msgflags=b'\x03')
+        msg.encrypt(USM_PRIV_CFB128_AES, key)
+        encoded = msg.encode_auth(proto, prepare_hmac(key, proto.hash_func))
+        msg.msgsecurityparameters[4] = b''
+        self.assertEqual(encoded, encode_auth_twice(msg, proto, key))
+
+
+class TestPriv(unittest.TestCase):
+
+    def test_decrypt(self):
+        key = os.urandom(32)
+        for size in (8, 16, 40, 1400):
+            data = os.urandom(size)
+            for name, proto in PRIV_PROTO.items():
+                params = [ENGINE_ID, 0x1234, 0xfedcba98, b'', b'', b'']
+                encrypted = proto.encrypt(key, data, params)
+                decrypted = proto.decrypt(key, encrypted, params)
+                self.assertEqual(decrypted[:size], data, name)
+
+    def test_reference(self):
+        key = os.urandom(32)
+        data = os.urandom(100)
+        params = [ENGINE_ID, 3, 4, b'', b'', os.urandom(8)]
+
+        iv = b'\x00\x00\x00\x03\x00\x00\x00\x04' + params[5]
+        ref = AES.new(key, AES.MODE_CFB, iv, segment_size=128)
+        encrypted = ref.encrypt(data + bytes(12))[:100]
+        self.assertEqual(
+            USM_PRIV_CFB256_AES.decrypt(key, encrypted, params), data)
+
+        iv = bytes(a ^ b for a, b in zip(params[5], key[8:16]))
+        ref = DES.new(key[:8], DES.MODE_CBC, iv)
+        encrypted = ref.encrypt(data[:96])
+        self.assertEqual(
+            USM_PRIV_CBC56_DES.decrypt(key, encrypted, params), data[:96])
+
+    def test_key_extension(self):
+        # passphrase and engine id of RFC3414 (A.3), the localized keys are
+        # the values of A.3.1 and A.3.2; the extended keys are the values
+        # of pysnmp 4.4.12 (AesBlumenthal192/256 for the Blumenthal and
+        # Aes192/256 for the Reeder key extension)
+        engine_id = bytes.fromhex('000000000000000000000002')
+        vectors = (
+            ('USM_AUTH_HMAC96_MD5', 'USM_PRIV_CFB128_AES',
+             '526f5eed9fcce26f8964c2930787d82b'),
+            ('USM_AUTH_HMAC96_MD5', 'USM_PRIV_CFB192_AES',
+             '526f5eed9fcce26f8964c2930787d82bfa24a92467426c2f'),
+            ('USM_AUTH_HMAC96_MD5', 'USM_PRIV_CFB256_AES',
+             '526f5eed9fcce26f8964c2930787d82b'
+             'fa24a92467426c2f4b09192be10dfaec'),
+            ('USM_AUTH_HMAC96_MD5', 'USM_PRIV_CFB192_AES_C',
+             '526f5eed9fcce26f8964c2930787d82b79eff44a90650ee0'),
+            ('USM_AUTH_HMAC96_MD5', 'USM_PRIV_CFB256_AES_C',
+             '526f5eed9fcce26f8964c2930787d82b'
+             '79eff44a90650ee0a3a40abfac5acc12'),
+            ('USM_AUTH_HMAC96_SHA', 'USM_PRIV_CFB128_AES',
+             '6695febc9288e36282235fc7151f128497b38f3f'),
+            ('USM_AUTH_HMAC96_SHA', 'USM_PRIV_CFB192_AES',
+             '6695febc9288e36282235fc7151f128497b38f3f505e07eb'),
+            ('USM_AUTH_HMAC96_SHA', 'USM_PRIV_CFB256_AES',
+             '6695febc9288e36282235fc7151f128497b38f3f'
+             '505e07eb9af25568fa1f5dbe'),
+            ('USM_AUTH_HMAC96_SHA', 'USM_PRIV_CFB192_AES_C',
+             '6695febc9288e36282235fc7151f128497b38f3f9b8b6d78'),
+            ('USM_AUTH_HMAC96_SHA', 'USM_PRIV_CFB256_AES_C',
+             '6695febc9288e36282235fc7151f128497b38f3f'
+             '9b8b6d78936ba6e7d19dfd9c'),
+        )
+        for auth_name, priv_name, expected in vectors:
+            auth_proto = AUTH_PROTO[auth_name]
+            ku = auth_proto.hash_passphrase('maplesyrup')
+            key = PRIV_PROTO[priv_name].localize(auth_proto, ku, engine_id)
+            expected = bytes.fromhex(expected)
+            self.assertEqual(key[:len(expected)], expected, priv_name)
+
+
+class TestCache(unittest.TestCase):
+
+    def test_concurrent_discovery(self):
+        loads = []
+
+        async def load():
+            loads.append(1)
+            await asyncio.sleep(0.01)
+            return UsmSecurityParameters(ENGINE_ID, 1, 2, b'user1', b'', b'')
+
+        async def main():
+            cache = SnmpV3Cache('user1', (USM_AUTH_HMAC96_SHA, 'Password1'))
+            res = await asyncio.gather(
+                *(cache.get_params(load) for _ in range(5)))
+            res.append(await cache.get_params(load))
+            return res
+
+        res = asyncio.run(main())
+        self.assertEqual(len(loads), 1)
+        self.assertEqual([is_new for _, is_new in res], [True] + [False] * 5)
+        self.assertTrue(all(p[0] == ENGINE_ID for p, _ in res))
+
+    def test_failed_discovery(self):
+        async def load():
+            await asyncio.sleep(0.01)
+            raise TimeoutError
+
+        async def main():
+            cache = SnmpV3Cache('user1')
+            return await asyncio.gather(
+                *(cache.get_params(load) for _ in range(3)),
+                return_exceptions=True)
+
+        res = asyncio.run(main())
+        self.assertTrue(all(isinstance(e, TimeoutError) for e in res))
+
+
+class FakeProtocol:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.discoveries = 0
+        self.params = UsmSecurityParameters(
+            ENGINE_ID, 1, 100, b'', b'', b'')
+
+        self.down = False
+        self.timeouts = []
+
+    def get_params(self):
+        return self.params
+
+    async def send(self, message):
+        self.discoveries += 1
+        if self.down:
+            raise SnmpTimeoutError
+
+    async def _send_encrypted(self, message, *args, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        return await self.send_encrypted(message, *args)
+
+    async def send_encrypted(self, message, *args, **kwargs):
+        if self.down:
+            raise SnmpTimeoutError
+        if self.errors:
+            exc, params = self.errors.pop(0)
+            if params is not None:
+                self.params = params
+            raise exc
+        return [], 0
+
+
+def make_client(protocol: FakeProtocol, engine_store=None):
+    async def make():
+        cl = SnmpV3('127.0.0.1', 'user1', (USM_AUTH_HMAC96_SHA, 'Password1'),
+                    engine_store=engine_store)
+        cl._protocol = protocol  # type: ignore
+        return cl
+    return asyncio.run(make())
+
+
+class TestFailures(unittest.TestCase):
+
+    def _run(self, protocol, nrequests=2):
+        cl = make_client(protocol)
+
+        async def main():
+            for _ in range(nrequests):
+                await cl._get([OIDS[0]])
+        asyncio.run(main())
+        return cl
+
+    def test_not_in_time_window(self):
+        report = UsmSecurityParameters(ENGINE_ID, 2, 5, b'', b'', b'')
+        protocol = FakeProtocol([(SnmpNotInTimeWindow('x', report), None)])
+        cl = self._run(protocol)
+        self.assertEqual(protocol.discoveries, 1)
+        params, _ = cl._cache._params  # type: ignore
+        self.assertEqual(params.authoritative_engine_boots, 2)
+
+    def test_timeout(self):
+        protocol = FakeProtocol([])
+        cl = make_client(protocol)
+
+        async def main():
+            await cl._get([OIDS[0]])
+            protocol.errors.append((SnmpTimeoutError, protocol.params))
+            with self.assertRaises(SnmpTimeoutError):
+                await cl._get([OIDS[0]])
+        asyncio.run(main())
+        self.assertEqual(protocol.discoveries, 1)
+        self.assertIsNotNone(cl._cache._params)
+
+    def test_engine_store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'engines.json')
+            store = SnmpV3EngineStore(path)
+            protocol = FakeProtocol([])
+            cl = make_client(protocol, store)
+            asyncio.run(cl._get([OIDS[0]]))
+            self.assertEqual(protocol.discoveries, 1)
+            store.save()
+
+            # after a restart no discovery is required
+            store = SnmpV3EngineStore(path)
+            engine_id, boots, _ = store.get('127.0.0.1:161')  # type: ignore
+            self.assertEqual((engine_id, boots), (ENGINE_ID, 1))
+            protocol = FakeProtocol([])
+            cl = make_client(protocol, store)
+            asyncio.run(cl._get([OIDS[0]]))
+            self.assertEqual(protocol.discoveries, 0)
+
+    def test_engine_store_stale(self):
+        store = SnmpV3EngineStore('/nonexistent/engines.json')
+        store.set('127.0.0.1:161', b'stale', 1, 0.0)
+        protocol = FakeProtocol([])
+        protocol.errors.append((SnmpTimeoutError, protocol.params))
+        cl = make_client(protocol, store)
+        asyncio.run(cl._get([OIDS[0]]))
+        self.assertEqual(protocol.discoveries, 1)
+        self.assertEqual(store.get('127.0.0.1:161')[0],  # type: ignore
+                         ENGINE_ID)
+        # a single short try with the params from the store
+        self.assertEqual(protocol.timeouts, [cl._timeouts[0]])
+
+    def test_engine_store_down(self):
+        store = SnmpV3EngineStore('/nonexistent/engines.json')
+        store.set('127.0.0.1:161', ENGINE_ID, 1, 0.0)
+        protocol = FakeProtocol([])
+        protocol.down = True
+        cl = make_client(protocol, store)
+        with self.assertRaises(SnmpTimeoutError):
+            asyncio.run(cl._get([OIDS[0]]))
+        # the full timeout sequence is only used by the discovery
+        self.assertEqual(protocol.timeouts, [cl._timeouts[0]])
+        self.assertEqual(protocol.discoveries, 1)
+
+
+class Response(PDU):
+    pdu_id = 2
+
+
+class Report(PDU):
+    pdu_id = 8
+
+
+NOT_IN_TIME_WINDOW = (1, 3, 6, 1, 6, 3, 15, 1, 1, 2, 0)
+UNKNOWN_ENGINE_ID = (1, 3, 6, 1, 6, 3, 15, 1, 1, 4, 0)
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    submitted = 0
+
+    def submit(self, *args, **kwargs):  # type: ignore
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+class FakeTransport:
+    """answers each request with an authenticated and encrypted response
+    holding nrows variable bindings; like an agent, a request for another
+    engine id (or a discovery) is answered with an unauthenticated
+    unknownEngineID report"""
+    def __init__(self, protocol: SnmpV3Protocol, nrows: int):
+        self.protocol = protocol
+        self.nrows = nrows
+        self.corrupt = False
+        self.msgflags = b'\x03'
+        # answer with a report with this OID instead of a response
+        self.report = None
+        self.engine_id = ENGINE_ID
+        self.engine_boots = 1
+        self.discoveries = 0
+        self.auth_proto = USM_AUTH_HMAC96_SHA
+
+    @property
+    def auth_key(self) -> bytes:
+        return self.auth_proto.localize(
+            self.auth_proto.hash_passphrase('Password1'), self.engine_id)
+
+    @property
+    def priv_key(self) -> bytes:
+        return self.auth_proto.localize(
+            self.auth_proto.hash_passphrase('Password2'), self.engine_id)
+
+    def request(self, oids, timeout: float = 10.0,
+                accept_report: bool = False):
+        pdu = SnmpGet(variable_bindings=oids)
+        msg = SnmpV3Message.make(
+            ScopedPDU(pdu, self.engine_id),
+            [self.engine_id, 1, 100, b'user1', b'', b''])
+        return self.protocol._send_encrypted(
+            msg, self.auth_proto, prepare_hmac(
+                self.auth_key, self.auth_proto.hash_func),
+            USM_PRIV_CFB128_AES, self.priv_key, timeout, accept_report)
+
+    def response(self, request_id: int, report=None,
+                 msgflags: bytes = b'') -> bytes:
+        report = report or self.report
+        msgflags = msgflags or self.msgflags
+        if report is None:
+            oids = [(*OIDS[0][:-1], i) for i in range(self.nrows)]
+            pdu = Response(request_id, variable_bindings=oids)
+        else:
+            pdu = Report(request_id, variable_bindings=[report])
+        msg = SnmpV3Message.make(
+            ScopedPDU(pdu, self.engine_id),
+            [self.engine_id, self.engine_boots, 100, b'user1', b'', b''])
+        msg.request_id = request_id
+        msg.msgflags = msgflags
+        if msgflags in (b'', b'\x00'):
+            return msg.encode()
+        msg.encrypt(USM_PRIV_CFB128_AES, self.priv_key)
+        data = msg.encode_auth(self.auth_proto, prepare_hmac(
+            self.auth_key, self.auth_proto.hash_func))
+        if self.corrupt:
+            data = data[:-1] + bytes((data[-1] ^ 1, ))
+        return data
+
+    def sendto(self, data: bytes, addr):
+        request = Package()
+        request.decode(data)
+        engine_id = request.msgsecurityparameters.authoritative_engine_id
+        if engine_id == self.engine_id:
+            data = self.response(request.request_id)
+        else:
+            self.discoveries += not engine_id
+            data = self.response(
+                request.request_id, UNKNOWN_ENGINE_ID, b'\x00')
+        self.protocol.loop.call_soon(
+            self.protocol.datagram_received, data, addr)
+
+
+def run_requests(nrows: int, **kwargs):
+    async def main():
+        protocol = SnmpV3Protocol(('127.0.0.1', 161), **kwargs)
+        transport = FakeTransport(protocol, nrows)
+        protocol.connection_made(transport)  # type: ignore
+        return await asyncio.gather(
+            *(transport.request(OIDS) for _ in range(3)))
+    return asyncio.run(main())
+
+
+class TestOffload(unittest.TestCase):
+
+    def test_inline(self):
+        with CountingExecutor() as executor:
+            res = run_requests(5, executor=executor)
+        self.assertEqual(executor.submitted, 0)
+        for vbs, _ in res:
+            self.assertEqual(len(vbs), 5)
+
+    def test_thread_pool(self):
+        with CountingExecutor() as executor:
+            res = run_requests(200, executor=executor,
+                               offload_threshold=1024)
+        self.assertEqual(executor.submitted, 3)
+        self.assertEqual(res, run_requests(200))
+
+    def test_process_pool(self):
+        with ProcessPoolExecutor(1) as executor:
+            res = run_requests(200, executor=executor,
+                               offload_threshold=1024)
+        self.assertEqual(res, run_requests(200))
+
+
+class TestVerify(unittest.TestCase):
+
+    def _run(self, accept_report: bool = False, **kwargs):
+        async def main():
+            protocol = SnmpV3Protocol(('127.0.0.1', 161))
+            self.assertIsNone(protocol.get_params())
+            transport = FakeTransport(protocol, 5)
+            for k, v in kwargs.items():
+                setattr(transport, k, v)
+            protocol.connection_made(transport)  # type: ignore
+            try:
+                await transport.request(
+                    OIDS, timeout=0.05, accept_report=accept_report)
+            finally:
+                await asyncio.sleep(0)  # done callbacks
+                self.assertEqual(protocol._auth, {})
+            return protocol.get_params()
+        return asyncio.run(main())
+
+    def test_verify(self):
+        params = self._run()
+        self.assertEqual(params.authoritative_engine_id, ENGINE_ID)
+
+    def test_auth_offset(self):
+        msg = make_message(b'u' * 200)
+        proto = USM_AUTH_HMAC96_SHA
+        mac = prepare_hmac(b'key', proto.hash_func)
+        data = msg.encode_auth(proto, mac)
+        pkg = Package()
+        pkg.decode(data)
+        offset = pkg.auth_offset
+        self.assertEqual(data[offset:offset + proto.sz],
+                         msg.msgsecurityparameters[4])
+        self.assertTrue(pkg.verify_auth(proto, mac, data))
+        self.assertFalse(pkg.verify_auth(
+            proto, prepare_hmac(b'other', proto.hash_func), data))
+
+    def test_not_in_time_window(self):
+        with self.assertRaises(SnmpNotInTimeWindow) as ctx:
+            self._run(report=NOT_IN_TIME_WINDOW, engine_boots=7)
+        self.assertEqual(ctx.exception.params.authoritative_engine_boots, 7)
+
+    def test_corrupt(self):
+        with self.assertLogs(level='ERROR'), \
+                self.assertRaises(SnmpTimeoutError):
+            self._run(corrupt=True)
+
+    def test_unauthenticated(self):
+        # the request stays pending for the authenticated response
+        for msgflags in (b'\x00', b''):
+            with self.assertLogs(level='ERROR'), \
+                    self.assertRaises(SnmpTimeoutError):
+                self._run(msgflags=msgflags)
+        with self.assertLogs(level='ERROR'), \
+                self.assertRaises(SnmpTimeoutError):
+            self._run(msgflags=b'\x00', report=UNKNOWN_ENGINE_ID)
+        # only unknown engine id reports are accepted, a notInTimeWindow
+        # report is sent authenticated by the agent
+        with self.assertLogs(level='ERROR'), \
+                self.assertRaises(SnmpTimeoutError):
+            self._run(msgflags=b'\x00', accept_report=True)
+        with self.assertLogs(level='ERROR'), \
+                self.assertRaises(SnmpTimeoutError):
+            self._run(msgflags=b'\x00', report=NOT_IN_TIME_WINDOW,
+                      accept_report=True)
+
+    def test_unauthenticated_report(self):
+        with self.assertRaises(SnmpUnknownEngineId):
+            self._run(msgflags=b'\x00', report=UNKNOWN_ENGINE_ID,
+                      accept_report=True)
+
+
+def run_client(main, engine_store=None):
+    """runs main(client, transport) with a client on a SnmpV3Protocol and
+    a FakeTransport"""
+    async def run():
+        protocol = SnmpV3Protocol(('127.0.0.1', 161), timeouts=(0.05, ))
+        transport = FakeTransport(protocol, 1)
+        protocol.connection_made(transport)  # type: ignore
+        cl = SnmpV3('127.0.0.1', 'user1', (USM_AUTH_HMAC96_SHA, 'Password1'),
+                    (USM_PRIV_CFB128_AES, 'Password2'), timeouts=(0.05, ),
+                    engine_store=engine_store)
+        cl._protocol = protocol
+        return await main(cl, transport)
+    return asyncio.run(run())
+
+
+class TestRediscovery(unittest.TestCase):
+
+    def test_engine_id_changed(self):
+        async def main(cl, transport):
+            await cl._get([OIDS[0]])
+            self.assertTrue(cl._cache._confirmed)
+
+            # the device is replaced, the unauthenticated report for the
+            # confirmed params is ignored right after the discovery
+            transport.engine_id = b'\x80\x00\x1f\x88\x04new'
+            with self.assertLogs(level='ERROR'), \
+                    self.assertRaises(SnmpTimeoutError):
+                await cl._get([OIDS[0]])
+            self.assertEqual(transport.discoveries, 1)
+
+            # and starts a new discovery once the interval has passed
+            cl._cache._discovered -= REDISCOVERY_INTERVAL
+            vbs, _ = await cl._get([OIDS[0]])
+            self.assertEqual(len(vbs), 1)
+            self.assertEqual(transport.discoveries, 2)
+            engine_id, _, _ = cl._cache.engine_state()
+            self.assertEqual(engine_id, transport.engine_id)
+        run_client(main)
+
+    def test_unknown_engine_id(self):
+        store = SnmpV3EngineStore('/nonexistent/engines.json')
+        store.set('127.0.0.1:161', b'\x80\x00\x1f\x88\x04old', 1, 0.0)
+
+        async def main(cl, transport):
+            # the params of the store are for another engine, the agent
+            # answers with a report instead of dropping the request
+            vbs, _ = await cl._get([OIDS[0]])
+            self.assertEqual(len(vbs), 1)
+            self.assertEqual(transport.discoveries, 1)
+            self.assertEqual(store.get('127.0.0.1:161')[0], ENGINE_ID)
+
+            # confirmed params are discovered again as well
+            transport.engine_id = b'\x80\x00\x1f\x88\x04new'
+            cl._cache._discovered -= REDISCOVERY_INTERVAL
+            vbs, _ = await cl._get([OIDS[0]])
+            self.assertEqual(len(vbs), 1)
+            self.assertEqual(transport.discoveries, 2)
+            self.assertEqual(store.get('127.0.0.1:161')[0],
+                             transport.engine_id)
+        run_client(main, store)
+
+
+class TestKeyCache(unittest.TestCase):
+
+    def setUp(self):
+        keycache.clear()
+
+    def tearDown(self):
+        keycache.set_cache_file(None)
+        keycache.clear()
+
+    def test_derive_key(self):
+        proto = USM_AUTH_HMAC96_SHA
+        key = keycache.derive_key(proto, 'Password1')
+        self.assertEqual(key, proto.hash_passphrase('Password1'))
+        self.assertIs(keycache.derive_key(proto, 'Password1'), key)
+
+    def test_derive_key_async(self):
+        async def derive():
+            return await asyncio.gather(*(
+                keycache.derive_key_async(USM_AUTH_HMAC96_SHA, 'Password1')
+                for _ in range(10)))
+        keys = asyncio.run(derive())
+        self.assertEqual(len(set(keys)), 1)
+
+    def test_derive_key_async_cancel(self):
+        async def derive():
+            first = asyncio.ensure_future(
+                keycache.derive_key_async(USM_AUTH_HMAC96_SHA, 'Password1'))
+            second = asyncio.ensure_future(
+                keycache.derive_key_async(USM_AUTH_HMAC96_SHA, 'Password1'))
+            await asyncio.sleep(0)
+            # cancelling the caller which started the derivation does not
+            # affect the other waiters
+            first.cancel()
+            key = await asyncio.wait_for(second, 5)
+            self.assertTrue(first.cancelled())
+            return key
+
+        key = asyncio.run(derive())
+        self.assertEqual(key, USM_AUTH_HMAC96_SHA.hash_passphrase('Password1'))
+        self.assertEqual(keycache._PENDING, {})
+
+    def test_cache_file_async(self):
+        async def derive():
+            await asyncio.gather(*(
+                keycache.derive_key_async(USM_AUTH_HMAC96_SHA, f'Password{i}')
+                for i in range(5)))
+            while keycache._store_task is not None:
+                await asyncio.sleep(0.01)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'keys')
+            keycache.set_cache_file(path, b'secret')
+            asyncio.run(derive())
+
+            keycache.clear()
+            keycache.set_cache_file(path, b'secret')
+            self.assertEqual(len(keycache._KEYS), 5)
+
+    def test_cache_file_loop(self):
+        writes = []
+        write = keycache._write
+
+        def _write(path, secret, keys):
+            writes.append(len(keys))
+            write(path, secret, keys)
+
+        async def main():
+            # clients created on the loop write the file once, off the loop
+            for i in range(5):
+                SnmpV3Cache('user1', (USM_AUTH_HMAC96_SHA, f'Password{i}'))
+            self.assertEqual(writes, [])
+            while keycache._store_task is not None:
+                await asyncio.sleep(0.01)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'keys')
+            keycache.set_cache_file(path, b'secret')
+            keycache._write = _write
+            try:
+                asyncio.run(main())
+            finally:
+                keycache._write = write
+            self.assertEqual(writes, [5])
+
+            keycache.clear()
+            keycache.set_cache_file(path, b'secret')
+            self.assertEqual(len(keycache._KEYS), 5)
+
+    def test_offload(self):
+        async def get_params(cache: SnmpV3Cache):
+            async def load():
+                return UsmSecurityParameters(
+                    ENGINE_ID, 1, 2, b'user1', b'', b'')
+            return await cache.get_params(load)
+
+        cache = SnmpV3Cache(
+            'user1', (USM_AUTH_HMAC96_SHA, 'Password1'),
+            (USM_PRIV_CFB128_AES, 'Password2'), offload=True)
+        self.assertIsNone(cache._auth_hash)
+        asyncio.run(get_params(cache))
+        self.assertEqual(
+            cache._priv_hash,
+            USM_AUTH_HMAC96_SHA.hash_passphrase('Password2'))
+
+    def test_localized_key(self):
+        proto = USM_AUTH_HMAC96_SHA
+        key = keycache.derive_key(proto, 'Password1')
+        localized = keycache.localized_key(proto, key, ENGINE_ID)
+        self.assertEqual(localized, proto.localize(key, ENGINE_ID))
+        keycache.localized_key(proto, key, ENGINE_ID)
+        self.assertEqual(keycache.localized_key.cache_info().hits, 1)
+
+    def test_cache_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'keys')
+            keycache.set_cache_file(path, b'secret')
+            key = keycache.derive_key(USM_AUTH_HMAC96_SHA, 'Password1')
+            # outside of an event loop the file is written by flush()
+            self.assertFalse(os.path.exists(path))
+            keycache.flush()
+            with open(path, 'rb') as f:
+                self.assertNotIn(key.hex().encode(), f.read())
+
+            keycache.clear()
+            keycache.set_cache_file(path, b'secret')
+            self.assertEqual(len(keycache._KEYS), 1)
+
+            # wrong secret, the file is ignored
+            keycache.clear()
+            keycache.set_cache_file(path, b'other')
+            self.assertEqual(len(keycache._KEYS), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()